@@ -5,17 +5,18 @@ import tkinter
 import pygame as pg  
 from pygame.constants import KEYDOWN
 
-from sudoku import Sudoku
+from pool import PuzzlePool
+from worker import SolvingWorker
 import tkinter
 from tkinter import messagebox
 
 buttonBarRelativeHeight = 0.1
-displayingSolutionStepPeriod = 200 # in miliseconds
+displayingSolutionStepPeriod = 200 # default period of displaying one solving step in miliseconds
 
 class sudoku_GUI():
     """Sudoku_GUI class provides User interface for sudoku game"""
 
-    def __init__(self, height , width, FPS, numberOfCellsToLeaveEmpty):
+    def __init__(self, height , width, FPS, numberOfCellsToLeaveEmpty, animateSolution = True, solutionStepPeriod = displayingSolutionStepPeriod):
         """sudoku_GUI after initialization creates a Sudoku game window using PyGame 
 
         :param height: Default height of a game window in px
@@ -26,6 +27,10 @@ class sudoku_GUI():
         :type FPS: int
         :param numberOfCellsToLeaveEmpty: Determins how many cells should be left out empty when generating sudoku grid
         :type numberOfCellsToLeaveEmpty: int
+        :param animateSolution: True for displaying solving step by step, False for displaying the solution as soon as it is found
+        :type animateSolution: bool
+        :param solutionStepPeriod: Period of displaying one solving step in miliseconds when solving is animated
+        :type solutionStepPeriod: int
         """
         # FPS setting
         pg.init()
@@ -35,7 +40,11 @@ class sudoku_GUI():
         # FPS setting
         self.width = width
         self.height = height
-        self.sudoku = Sudoku(numberOfCellsToLeaveEmpty)
+
+        # Puzzles are pre-generated in the background, so restart does not block the game loop
+        self.numberOfCellsToLeaveEmpty = numberOfCellsToLeaveEmpty
+        self.puzzlePool = PuzzlePool([numberOfCellsToLeaveEmpty])
+        self.sudoku = self.puzzlePool.get(numberOfCellsToLeaveEmpty)
         self.grid = self.sudoku.grid
 
         # Game information
@@ -50,11 +59,23 @@ class sudoku_GUI():
         # For creating control parts
         self.inicializationDone = False
 
+        # Rendered digits { (value, isPrefilled) : pygame.Surface }, they are rendered again when the window is resized
+        self.glyphs = {}
+
+        # What is displayed in the window, only cells that differ from it are redrawn
+        self.displayedGrid = None
+        self.displayedPickedElement = None
+
         # Game states
         self.displayMistakes = False
         self.computeSolution = False
         self.isWin = False
 
+        # Solving runs in a background worker, so the game loop is not blocked by it
+        self.animateSolution = animateSolution
+        self.solutionStepPeriod = solutionStepPeriod
+        self.solvingWorker = None
+
         # Creates window
         self.create_window()
 
@@ -64,6 +85,7 @@ class sudoku_GUI():
         win = pg.display.set_mode((self.width, self.height), pg.RESIZABLE)
         pg.display.set_caption("Sudoku")
         self.win = win
+        self.set_dimensions()
         self.display_layout()
         self.inicializationDone = True
 
@@ -91,15 +113,38 @@ class sudoku_GUI():
         self.checkButton.draw()
         self.solveButton.draw()
         self.restartButton.draw()
+
+    def set_dimensions(self):
+        """Sets size of Sudoku cells and font based on the size of the game window and drops digits rendered in the old size"""
+        # Dimension of one sudoku cell
+        self.dim = int(min(self.width, self.height * (1 - buttonBarRelativeHeight)) // 11) 
+        self.font = pg.font.SysFont('arial', round(0.7*self.dim))
+        self.glyphs.clear()
+        if self.inicializationDone:
+            for button in (self.checkButton, self.solveButton, self.restartButton):
+                button.set_font(self.font)
+
+    def glyph(self, i, j):
+        """Returns rendered digit of the cell, digits are rendered only once for each size and colour
+
+        :return: pygame.Surface
+        """
+        key = (self.grid[i][j], self.originalGrid[i][j] != 0)
+        glyph = self.glyphs.get(key)
+        if glyph is None:
+            glyph = self.font.render(str(key[0]), True, (0, 0, 0) if key[1] else self.gridElementColor)
+            self.glyphs[key] = glyph
+        return glyph
         
     def restart(self):
         """Restarts the game"""
+        self.stop_solving()
         self.isElementPicked = False
         self.displayMistakes = False
         self.computeSolution = False
         self.isWin = False
         
-        self.sudoku = Sudoku(self.sudoku.numberOfCellsToLeaveEmpty)
+        self.sudoku = self.puzzlePool.get(self.numberOfCellsToLeaveEmpty)
         self.grid = self.sudoku.grid
         self.originalGrid = [[self.grid[i][j] for j in range(9)] for i in range(9)]
         self.display_layout()
@@ -145,11 +190,7 @@ class sudoku_GUI():
         for i in range(0, len(self.grid[0])):
             for j in range(0, len(self.grid[0])):
                 if 0 < self.grid[i][j] < 10:
-                    if self.originalGrid[i][j] != 0:
-                        value = self.font.render(str(self.grid[i][j]), True, (0, 0, 0))
-                    else: value = self.font.render(str(self.grid[i][j]), True, self.gridElementColor)
-
-                    self.win.blit(value, ((j+1)*self.dim + round(0.4*self.dim), (i+1)*self.dim + self.dim//10))
+                    self.win.blit(self.glyph(i, j), ((j+1)*self.dim + round(0.4*self.dim), (i+1)*self.dim + self.dim//10))
 
         # Draws lines of Sudoku grid
         for i in range(0,10):
@@ -162,10 +203,7 @@ class sudoku_GUI():
         
     def display_layout(self):
         """ Displays all GUI elements on self.win """
-        # Dimension of one sudoku cell
-        self.dim = int(min(self.width, self.height * (1 - buttonBarRelativeHeight)) // 11) 
         self.win.fill(self.backgroundColor)
-        self.font = pg.font.SysFont('arial', round(0.7*self.dim))
 
         self.display_buttons() 
 
@@ -176,8 +214,56 @@ class sudoku_GUI():
             self.win.blit(text, textRect)
         else: self.display_grid()
 
+        # Mistakes and win message are displayed only by full redraw
+        self.displayedGrid = None if self.displayMistakes or self.isWin else [row[:] for row in self.grid]
+        self.displayedPickedElement = self.pickedElement if self.isElementPicked else None
         pg.display.update()
 
+    def display_cell(self, i, j):
+        """Redraws inside of a cell without its borders
+
+        :return: redrawn rectangle
+        :type return: pygame.Rect
+        """
+        isPicked = self.isElementPicked and self.pickedElement == (i + 1, j + 1) and self.originalGrid[i][j] == 0
+        # Borders are at most 4 px wide, so they are not overdrawn
+        rect = pg.draw.rect(self.win, (255, 255, 255) if isPicked else self.backgroundColor,
+                            ((j+1)*self.dim + 2, (i+1)*self.dim + 2, self.dim - 4, self.dim - 4))
+        if 0 < self.grid[i][j] < 10:
+            self.win.blit(self.glyph(i, j), ((j+1)*self.dim + round(0.4*self.dim), (i+1)*self.dim + self.dim//10))
+        return rect
+
+    def display_changes(self, redrawButtons = False):
+        """Redraws only cells whose value or highlighting changed since the last redraw
+
+        When mistakes or win message are displayed or should be displayed, whole layout is redrawn.
+        :param redrawButtons: True for redrawing also buttons, e.g. when their pressed state might have changed
+        :type redrawButtons: bool
+        """
+        if self.displayedGrid is None or self.displayMistakes or self.isWin:
+            self.display_layout()
+            return
+
+        dirtyCells = [(i, j) for i in range(9) for j in range(9) if self.grid[i][j] != self.displayedGrid[i][j]]
+        pickedElement = self.pickedElement if self.isElementPicked else None
+        if pickedElement != self.displayedPickedElement:
+            for element in (pickedElement, self.displayedPickedElement):
+                if element is not None and 0 < element[0] < 10 and 0 < element[1] < 10:
+                    dirtyCells.append((element[0] - 1, element[1] - 1))
+            self.displayedPickedElement = pickedElement
+
+        dirtyRects = []
+        for i, j in dirtyCells:
+            self.displayedGrid[i][j] = self.grid[i][j]
+            dirtyRects.append(self.display_cell(i, j))
+
+        if redrawButtons:
+            self.display_buttons()
+            # Borders of buttons are drawn over the edges of their rectangles
+            dirtyRects += [button.rect.inflate(2 * button.border_thickness, 2 * button.border_thickness)
+                           for button in (self.checkButton, self.solveButton, self.restartButton)]
+        pg.display.update(dirtyRects)
+
     def resize(self, size):
         """ A function to change the size of a window
 
@@ -208,7 +294,7 @@ class sudoku_GUI():
         if 0 < i < 10 and 0 < j < 10:
             self.isElementPicked = True
             self.pickedElement = (i, j)
-        self.display_layout()
+        self.display_changes(redrawButtons = True)
 
     def key_pressed(self, event):
         """ Processes the event pygame.KEYDOWN and, if necessary, arranges the change of the given letter.
@@ -216,8 +302,8 @@ class sudoku_GUI():
         :param event: Event in which keydown was captured
         :type event: pygame.event
         """
-        # Determines if the picked element is user changeble
-        if(self.originalGrid[self.pickedElement[0]-1][self.pickedElement[1]-1] != 0):
+        # Determines if the picked element is user changeble, the grid cannot be changed while it is being solved
+        if self.computeSolution or (self.originalGrid[self.pickedElement[0]-1][self.pickedElement[1]-1] != 0):
             return
         
         # Changes the value of the picked element to the based on the key that was pressed
@@ -227,11 +313,33 @@ class sudoku_GUI():
         if (0 <= charCode - 48 < 10):  #Checking for valid input
             self.sudoku.set_cells_value_user((self.pickedElement[0]-1, self.pickedElement[1]-1), charCode - 48)
             self.isElementPicked = False
-            self.display_layout()
+            self.display_changes()
 
          # When Backspace or Delete button, picked element will be deleted.
         if (charCode == 8 or charCode == 127):
-            self.sudoku.set_cell_as_empty((self.pickedElement[0]-1, self.pickedElement[1]-1))
+            self.sudoku.set_cells_value_user((self.pickedElement[0]-1, self.pickedElement[1]-1), 0)
+            self.display_changes()
+
+    def use_hint(self):
+        """Fills in or empties the cell given by Sudoku.hint(), the change can be taken back like edits of user"""
+        if self.computeSolution:
+            return
+        hint = self.sudoku.hint()
+        if hint is None:
+            return
+        self.sudoku.set_cells_value_user(hint.cell, hint.value)
+        self.display_changes()
+
+    def undo_edit(self, isRedo = False):
+        """Takes back the last edit of user or makes it again
+
+        :param isRedo: True for making again the last edit taken back
+        :type isRedo: bool
+        """
+        if self.computeSolution:
+            return
+        if (self.sudoku.redo() if isRedo else self.sudoku.undo()) is not None:
+            self.display_changes()
 
     def FPS_hold(self):
         """ Holds the main loop as long as needed based on the set FPS """
@@ -243,37 +351,65 @@ class sudoku_GUI():
         self.create_window
     
     def compute_solution(self):
-        """Sets Sudoku app to computing state"""
-        self.computeSolution = True
-        self.nextStepTimer = pg.time.get_ticks() + displayingSolutionStepPeriod
+        """Sets Sudoku app to computing state and starts solving in the background"""
+        if self.computeSolution:
+            return
         self.displayMistakes = False
         self.check_for_mistakes()
 
+        # Mistakes are not displayed further, because the worker removes them from the Sudoku object
+        self.displayMistakes = False
+        self.computeSolution = True
+        self.solvingStartTime = pg.time.get_ticks()
+        self.displayedSteps = 0
+        self.solvingWorker = SolvingWorker(self.sudoku, self.animateSolution)
+
+    def stop_solving(self):
+        """Cancels solving in the background, if it is running"""
+        if self.solvingWorker is not None:
+            self.solvingWorker.cancel()
+            self.solvingWorker = None
+        self.computeSolution = False
+
     def check_for_mistakes(self): 
         """Handles checking whether Sudoku grid is validly filled in"""
+        # The Sudoku object is being changed by the solving worker
+        if self.computeSolution:
+            return
         self.displayMistakes = not self.displayMistakes
         
         # if all cells are valid and filled by user
         if (self.displayMistakes and self.sudoku.is_win()):
             self.isWin = True # game is finished
-        self.display_grid()
-        pg.display.update()
+        self.display_changes()
 
     def handle_solution_calculating (self):
-        """Handles solution calculating and displaying"""
-        # First delete all not valid cells
-        # try to fill in rest
-        status = self.sudoku.solve()
-        if status == 0:
+        """Handles displaying of progress of solving in the background"""
+        if self.animateSolution:
+            # Number of steps that should be displayed by now
+            dueSteps = (pg.time.get_ticks() - self.solvingStartTime) // self.solutionStepPeriod + 1
+            snapshot = self.solvingWorker.take(dueSteps - self.displayedSteps)
+            if snapshot is not None:
+                self.displayedSteps = dueSteps
+        else:
+            snapshot = self.solvingWorker.take()
+
+        status = self.solvingWorker.finished()
+        if status is not None:
+            self.solvingWorker = None
             self.computeSolution = False
+            self.grid = self.sudoku.grid
+        elif snapshot is not None:
+            self.grid = snapshot
+        else:
+            return
+
         if status == 2:
             tk = tkinter.Tk()
             tk.wm_withdraw() # hides the tkinter main window
             messagebox.showinfo("No possible solution", "OK")
-            self.computeSolution = False
-        self.display_layout()
-        pg.display.update()
-            
+        self.display_changes()
+
     def check(self):
         """Provides interactivity of the aplication"""
         events = pg.event.get()
@@ -283,17 +419,21 @@ class sudoku_GUI():
             if event.type == pg.MOUSEBUTTONUP and event.button == 1:
                 self.mouse_click()
             if event.type == pg.QUIT:
+                self.stop_solving()
+                self.puzzlePool.close()
                 pg.quit()
                 return False
             if self.isElementPicked and event.type == pg.KEYDOWN:
                 self.key_pressed(event)
             if event.type == pg.KEYDOWN and event.unicode == 'q':
                 pass
+            if event.type == pg.KEYDOWN and event.unicode == 'h':
+                self.use_hint()
+            if event.type == pg.KEYDOWN and event.mod & pg.KMOD_CTRL and event.key in (pg.K_z, pg.K_y):
+                self.undo_edit(isRedo = event.key == pg.K_y)
         
         # displaying solution
-        currentTime = pg.time.get_ticks()
-        if self.computeSolution and currentTime >= self.nextStepTimer:
-            self.nextStepTimer = currentTime + displayingSolutionStepPeriod
+        if self.computeSolution:
             self.handle_solution_calculating()
             
         self.FPS_hold()
@@ -326,9 +466,19 @@ class Button():
         self.pressedCollour = pressedCollour
         self.text = buttonText
         self.font = font
+        self.textSurface = None # rendered text, it is rendered only when font changes
         self.pressed = False
         self.border_thickness = border_thickness
 
+    def set_font(self, font):
+        """Changes font of the button text
+
+        :param font: font of the button text
+        :type font: pygame.font
+        """
+        self.font = font
+        self.textSurface = None
+
     def set_size(self, position, height, width):
         """Draws button on the pygame win
 
@@ -350,7 +500,9 @@ class Button():
         self.rect = pg.draw.rect(self.win, buttonInnerColour, 
             (self.position[1], self.position[0], self.height, self.width))
         # button text
-        text = self.font.render(self.text, True, (0,0,0))
+        if self.textSurface is None:
+            self.textSurface = self.font.render(self.text, True, (0,0,0))
+        text = self.textSurface
         textRect = text.get_rect()
         textRect.center = (self.position[1] + (self.height / 2), self.position[0] + (self.width / 2))
         self.win.blit(text, textRect)
@@ -0,0 +1,214 @@
+# Validating and analysing large batches of Sudoku grids at once with NumPy
+#
+# Grids are kept in an (N, size, size) array of uint8, 0 for empty cell. Like in Sudoku class, numbers are bitmasks,
+# bitmasks of numbers used once and repeated in every row, column and box are computed for all grids together,
+# so Python loops run only over the cells of one unit, not over grids. validate() processes large batches in slices,
+# so intermediate arrays stay in cache.
+# NumPy is needed only by this module, the rest of the package does not depend on it.
+import numpy as np
+
+from units import get_tables, symbols
+
+def parse_puzzles(puzzles, boxSize = 3):
+    """Converts puzzle strings to an array of grids
+
+    :param puzzles: Strings of size^2 characters without whitespace, '.' or '0' for empty cell, see sudoku.format_puzzle()
+    :type puzzles: iterable of str
+    :param boxSize: Box size of the puzzles
+    :type boxSize: int
+    :return: numpy array of shape (N, size, size) and type uint8
+    """
+    size = get_tables(boxSize).size
+    puzzles = list(puzzles)
+    for puzzle in puzzles:
+        if len(puzzle) != size * size:
+            raise ValueError("Puzzle has " + str(len(puzzle)) + " characters instead of " + str(size * size))
+
+    # Value of every byte, 255 for invalid characters
+    table = np.full(256, 255, dtype = np.uint8)
+    for value, character in enumerate(symbols[:size + 1]):
+        table[ord(character)] = value
+        table[ord(character.lower())] = value
+    table[ord('.')] = 0
+    try:
+        data = np.frombuffer(''.join(puzzles).encode('ascii'), dtype = np.uint8)
+    except UnicodeEncodeError:
+        raise ValueError("Invalid character in puzzles")
+    values = table[data]
+    if (values == 255).any():
+        raise ValueError("Invalid character in puzzles")
+    return values.reshape(-1, size, size)
+
+def as_grids(grids, boxSize = 3):
+    """Converts grids to an array of shape (N, size, size) and type uint8 and checks their values
+
+    :param grids: Array of shape (N, size, size), list of grids (lists of lists of int) or list of puzzle strings
+    :param boxSize: Box size of the grids
+    :type boxSize: int
+    :return: numpy array, the given one if it does not need to be converted
+    """
+    if isinstance(grids, (list, tuple)) and grids and isinstance(grids[0], str):
+        return parse_puzzles(grids, boxSize)
+    size = get_tables(boxSize).size
+    grids = np.asarray(grids)
+    if grids.ndim != 3 or grids.shape[1:] != (size, size):
+        raise ValueError("Grids must have shape (N, " + str(size) + ", " + str(size) + "), not " + str(grids.shape))
+    if grids.size and (grids.min() < 0 or grids.max() > size):
+        raise ValueError("Values of grids must be between 0 and " + str(size))
+    return grids.astype(np.uint8, copy = False)
+
+def mask_type(size):
+    """Returns the smallest unsigned type holding bitmasks of size numbers"""
+    return np.uint16 if size <= 16 else np.uint32
+
+def as_prefilled(prefilled):
+    """Converts prefilled cells to a boolean array, rows may be bytes like rows of Sudoku.prefilled
+
+    :param prefilled: Array, nested lists of bools or lists of bytes rows
+    :return: boolean numpy array
+    """
+    if isinstance(prefilled, bytes):
+        return np.frombuffer(prefilled, dtype = np.uint8) != 0
+    if isinstance(prefilled, (list, tuple)) and prefilled and isinstance(prefilled[0], (list, tuple, bytes)):
+        return np.stack([as_prefilled(part) for part in prefilled])
+    return np.asarray(prefilled, dtype = bool)
+
+def unit_masks(grids, boxSize = 3):
+    """Computes bitmasks of numbers used in every row, column and box of every grid
+
+    :param grids: Array returned by as_grids()
+    :return: tuple (bits, used, repeated), bits is array of shape (N, size, size) with bitmask of the number of every cell,
+        bit x stands for number x + 1, 0 for empty cells. used and repeated are tuples (rows, columns, boxes) of arrays
+        of shape (N, size) with bitmasks of numbers used at least once and at least twice in every row, column and box.
+        Bitmasks are uint16 for grids up to 16x16 and uint32 for larger grids
+    """
+    tables = get_tables(boxSize)
+    size = tables.size
+    maskType = mask_type(size)
+    bitValues = np.array([0] + [1 << number for number in range(size)], dtype = maskType)
+    bits = bitValues[grids]
+    boxBits = bits.reshape(-1, boxSize, boxSize, boxSize, boxSize).transpose(0, 1, 3, 2, 4).reshape(-1, size, size)
+    used = []
+    repeated = []
+    # Units are walked cell by cell for all grids at once, a number seen in an earlier cell of a unit is repeated
+    for unitBits in (bits, bits.transpose(0, 2, 1), boxBits):
+        once = np.zeros(unitBits.shape[:2], dtype = maskType)
+        twice = np.zeros(unitBits.shape[:2], dtype = maskType)
+        for k in range(size):
+            cellBits = unitBits[:, :, k]
+            twice |= once & cellBits
+            once |= cellBits
+        used.append(once)
+        repeated.append(twice)
+    return (bits, tuple(used), tuple(repeated))
+
+def conflicts_of_masks(bits, repeated, boxSize, prefilled = None):
+    """Finds conflicts from masks returned by unit_masks(), see find_conflicts()"""
+    rows, columns, boxes = repeated
+    boxOfCell = np.array(get_tables(boxSize).boxOfCell)
+    conflicts = np.stack(((bits & columns[:, None, :]) != 0, (bits & rows[:, :, None]) != 0, (bits & boxes[:, boxOfCell]) != 0), axis = -1)
+    if prefilled is not None:
+        conflicts &= ~as_prefilled(prefilled)[..., None]
+    return conflicts
+
+def candidates_of_masks(bits, used, boxSize):
+    """Computes candidates from masks returned by unit_masks(), see candidates()"""
+    tables = get_tables(boxSize)
+    rows, columns, boxes = used
+    free = rows[:, :, None] | columns[:, None, :]
+    free |= boxes[:, np.array(tables.boxOfCell)]
+    np.invert(free, out = free)
+    free &= free.dtype.type(tables.fullMask)
+    free *= bits == 0 # filled cells have no candidates
+    return free
+
+def find_conflicts(grids, boxSize = 3, prefilled = None):
+    """Finds cells whose number repeats in their row, column or box
+
+    :param grids: Grids, see as_grids()
+    :param boxSize: Box size of the grids
+    :type boxSize: int
+    :param prefilled: Boolean array of shape (N, size, size) or (size, size) of cells that cannot be error cells,
+        see Sudoku.prefilled, None for finding conflicts of all cells like Sudoku.find_conflicts()
+    :return: boolean array of shape (N, size, size, 3) with flags (column, row, box) of every cell like Sudoku.errorCells
+    """
+    bits, _, repeated = unit_masks(as_grids(grids, boxSize), boxSize)
+    return conflicts_of_masks(bits, repeated, boxSize, prefilled)
+
+def is_win(grids, boxSize = 3, conflicts = None):
+    """Checks which grids are solved, i.e. filled without any conflict, like Sudoku.is_win()
+
+    :param conflicts: Array returned by find_conflicts() for the grids, None for finding them
+    :return: boolean array of shape (N,)
+    """
+    grids = as_grids(grids, boxSize)
+    if conflicts is None:
+        conflicts = find_conflicts(grids, boxSize)
+    return (grids != 0).all(axis = (1, 2)) & ~conflicts.any(axis = (1, 2, 3))
+
+def candidates(grids, boxSize = 3):
+    """Computes bitmasks of numbers not used in the row, column and box of every empty cell
+
+    :param grids: Grids, see as_grids()
+    :return: array of shape (N, size, size), bit x stands for number x + 1, 0 for filled cells, see unit_masks() for its type
+    """
+    bits, used, _ = unit_masks(as_grids(grids, boxSize), boxSize)
+    return candidates_of_masks(bits, used, boxSize)
+
+def to_error_cells(conflicts):
+    """Converts conflicts of one grid to a dict like Sudoku.errorCells
+
+    :param conflicts: Array of shape (size, size, 3), e.g. find_conflicts(grids)[n]
+    :return: dict { (i, j) : (column, row, box) }
+    """
+    return {(int(i), int(j)): tuple(bool(flag) for flag in conflicts[i, j]) for i, j in zip(*np.nonzero(conflicts.any(axis = 2)))}
+
+class BatchValidation:
+    """Results of validating a batch of grids, see validate()"""
+    conflicts : np.ndarray
+    errorCounts : np.ndarray
+    emptyCounts : np.ndarray
+    isWin : np.ndarray
+    candidates : np.ndarray
+
+    def __init__(self, count, size, withCandidates):
+        """Initializes a BatchValidation object with arrays for count grids
+
+        :param withCandidates: True for allocating array of candidates, otherwise candidates is None
+        :type withCandidates: bool
+        """
+        self.conflicts = np.zeros((count, size, size, 3), dtype = bool) # (column, row, box) flags of every cell
+        self.errorCounts = np.zeros(count, dtype = np.int32) # number of error cells of every grid
+        self.emptyCounts = np.zeros(count, dtype = np.int32) # number of empty cells of every grid
+        self.isWin = np.zeros(count, dtype = bool)
+        self.candidates = np.zeros((count, size, size), dtype = mask_type(size)) if withCandidates else None
+
+def validate(grids, boxSize = 3, prefilled = None, withCandidates = True, sliceSize = 4096):
+    """Finds conflicts, completion status and candidates of a batch of grids
+
+    :param grids: Grids, see as_grids()
+    :param boxSize: Box size of the grids
+    :type boxSize: int
+    :param prefilled: Cells that cannot be error cells, see find_conflicts()
+    :param withCandidates: False for skipping computing of candidates
+    :type withCandidates: bool
+    :param sliceSize: Number of grids processed at once, it limits memory used by intermediate arrays
+    :type sliceSize: int
+    :return: BatchValidation object
+    """
+    grids = as_grids(grids, boxSize)
+    if prefilled is not None:
+        prefilled = np.broadcast_to(as_prefilled(prefilled), grids.shape)
+    result = BatchValidation(len(grids), grids.shape[1], withCandidates)
+    for start in range(0, len(grids), sliceSize):
+        part = grids[start:start + sliceSize]
+        end = start + len(part)
+        bits, used, repeated = unit_masks(part, boxSize)
+        conflicts = conflicts_of_masks(bits, repeated, boxSize, None if prefilled is None else prefilled[start:end])
+        result.conflicts[start:end] = conflicts
+        result.errorCounts[start:end] = conflicts.any(axis = 3).sum(axis = (1, 2))
+        result.emptyCounts[start:end] = (part == 0).sum(axis = (1, 2))
+        result.isWin[start:end] = (result.emptyCounts[start:end] == 0) & (result.errorCounts[start:end] == 0)
+        if withCandidates:
+            result.candidates[start:end] = candidates_of_masks(bits, used, boxSize)
+    return result
@@ -0,0 +1,318 @@
+# Measures generating, solving and editing Sudoku grids on fixed corpora of puzzles
+import json
+import sys
+import tracemalloc
+from argparse import ArgumentParser
+from random import Random
+from time import perf_counter
+
+from sudoku import Sudoku, SolveStats, format_puzzle
+from solvers import solverBackends
+
+# Fixed corpora of puzzles with unique solution, 81 characters row by row, 0 for empty cell
+corpora = {
+    'easy': [
+        '003020600900305001001806400008102900700000008006708200002609500800203009005010300',
+        '200080300060070084030500209000105408000000000402706000301007040720040060004010003',
+        '000000907000420180000705026100904000050000040000507009920108000034059000507000000',
+        '030050040008010500460000012070502080000603000040109030250000098001020600080060020',
+    ],
+    'hard': [
+        '800000000003600000070090200050007000000045700000100030001000068008500010090000400',
+        '100007090030020008009600500005300900010080002600004000300000010040000007007000300',
+    ],
+    '17-clue': [
+        '000000010400000000020000000000050407008000300001090000300400200050100000000806000',
+        '400000805030000000000700000020000060000080400000010000000603070500200000104000000',
+        '000000000000003085001020000000507000004000100090000000500000073002010000000040009',
+    ],
+}
+
+maxBacktrackingSteps = 2000000 # backtracking is stopped after this number of steps
+
+def summarize(times, steps = None):
+    """Computes statistics of measured times
+
+    :param times: Measured times in seconds
+    :type times: list of float
+    :param steps: Total number of solving steps during the measured time, None if not relevant
+    :type steps: int
+    :return: dict with number of runs, mean, p50 and p99 in milliseconds and steps per second
+    """
+    times = sorted(times)
+    summary = {
+        'runs': len(times),
+        'mean_ms': 1000 * sum(times) / len(times),
+        'p50_ms': 1000 * times[(len(times) - 1) // 2],
+        'p99_ms': 1000 * times[round(0.99 * (len(times) - 1))],
+    }
+    if steps is not None:
+        summary['steps_per_s'] = steps / sum(times) if sum(times) else 0
+    return summary
+
+def bench_generate(repeat, numberOfCellsToLeaveEmpty, solver, rng, unique = False, boxSize = 3):
+    """Measures Sudoku.__init__, which generates a puzzle
+
+    :param rng: Random generator used for generating
+    :type rng: random.Random
+    :param boxSize: Box size of generated puzzles
+    :type boxSize: int
+    :return: summary of times, see summarize()
+    """
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        Sudoku(numberOfCellsToLeaveEmpty, solver, unique, seed = rng, boxSize = boxSize)
+        times.append(perf_counter() - start)
+    return summarize(times)
+
+def bench_solve(puzzles, solver):
+    """Measures Sudoku.solve_full() on every puzzle
+
+    :return: summary of times with number of solved puzzles, see summarize()
+    """
+    times = []
+    steps = 0
+    solved = 0
+    for puzzle in puzzles:
+        sudoku = Sudoku(0, solver, puzzle = puzzle)
+        start = perf_counter()
+        result = sudoku.solve_full(maxSteps = maxBacktrackingSteps)
+        times.append(perf_counter() - start)
+        steps += result.steps
+        solved += result.status == 0
+    summary = summarize(times, steps)
+    summary['solved'] = solved
+    return summary
+
+def bench_step_wise(puzzles):
+    """Measures loops of step by step Sudoku.solve() calls on every puzzle
+
+    :return: summary of times with number of solved puzzles, see summarize()
+    """
+    times = []
+    totalSteps = 0
+    solved = 0
+    for puzzle in puzzles:
+        sudoku = Sudoku(0, puzzle = puzzle)
+        steps = 0
+        start = perf_counter()
+        while steps < maxBacktrackingSteps and sudoku.solve() == 1:
+            steps += 1
+        times.append(perf_counter() - start)
+        totalSteps += steps
+        solved += steps < maxBacktrackingSteps
+    summary = summarize(times, totalSteps)
+    summary['solved'] = solved
+    return summary
+
+def collect_stats(puzzles):
+    """Collects instrumentation counters of backtracking solve_full() summed over the puzzles
+
+    :return: dict of counters, see SolveStats.to_dict()
+    """
+    total = SolveStats()
+    for puzzle in puzzles:
+        sudoku = Sudoku(0, puzzle = puzzle)
+        stats = sudoku.enable_stats()
+        sudoku.solve_full(maxSteps = maxBacktrackingSteps)
+        total.add(stats)
+    return total.to_dict()
+
+def bench_map_grid(repeat, puzzles):
+    """Measures Sudoku.map_grid() on the given puzzles
+
+    :return: summary of times, see summarize()
+    """
+    sudokus = [Sudoku(0, puzzle = puzzle) for puzzle in puzzles]
+    times = []
+    for k in range(repeat):
+        sudoku = sudokus[k % len(sudokus)]
+        start = perf_counter()
+        sudoku.map_grid()
+        times.append(perf_counter() - start)
+    return summarize(times)
+
+def bench_user_edits(repeat, puzzles, editsCount, rng):
+    """Measures sequences of random Sudoku.set_cells_value_user() edits of empty cells
+
+    :param editsCount: Number of edits in one sequence
+    :type editsCount: int
+    :param rng: Random generator choosing edits
+    :type rng: random.Random
+    :return: summary of times of whole sequences, see summarize()
+    """
+    times = []
+    for k in range(repeat):
+        sudoku = Sudoku(0, puzzle = puzzles[k % len(puzzles)])
+        cells = [tuple(cell[:2]) for cell in sudoku.cellsToSolve]
+        edits = [(rng.choice(cells), rng.randint(0, 9)) for _ in range(editsCount)]
+        start = perf_counter()
+        for cell, value in edits:
+            sudoku.set_cells_value_user(cell, value)
+        times.append(perf_counter() - start)
+    return summarize(times)
+
+def check_step_wise(count, editsCount, rng):
+    """Checks that solve_full() gives the same result as repeated solve() calls on generated puzzles with random user edits
+
+    Both run the same backtracking, so they must end with the same status, grid and number of steps. Every solver backend
+    must also find a solution, or none when the backtracking does not, after a few solve() calls filled some cells.
+    :param count: Number of checked puzzles
+    :type count: int
+    :param editsCount: Number of random set_cells_value_user() edits of every puzzle before solving
+    :type editsCount: int
+    :param rng: Random generator of puzzles and edits
+    :type rng: random.Random
+    :return: list of seeds of puzzles with different results
+    """
+    mismatches = []
+    for _ in range(count):
+        seed = rng.getrandbits(32)
+        sudoku = Sudoku(50, seed = seed)
+        puzzle = format_puzzle(sudoku.grid)
+        cells = [tuple(cell[:2]) for cell in sudoku.cellsToSolve]
+        edits = [(rng.choice(cells), rng.randint(1, 9)) for _ in range(editsCount)]
+        for cell, value in edits:
+            sudoku.set_cells_value_user(cell, value)
+        stepWise = sudoku.clone()
+        result = sudoku.solve_full(maxSteps = maxBacktrackingSteps)
+        steps = 0
+        status = 1
+        while steps < maxBacktrackingSteps and status == 1:
+            status = stepWise.solve()
+            steps += status == 1
+        isMismatch = status == 1 or result.status != status or result.steps != steps or sudoku.grid != stepWise.grid
+        for solver in solverBackends:
+            backendSudoku = Sudoku(0, solver, puzzle = puzzle)
+            for cell, value in edits:
+                backendSudoku.set_cells_value_user(cell, value)
+            for _ in range(rng.randint(0, 20)):
+                backendSudoku.solve()
+            backendResult = backendSudoku.solve_full()
+            isMismatch = isMismatch or backendResult.status != status or (status == 0 and bool(backendSudoku.find_conflicts()))
+        if isMismatch:
+            mismatches.append(seed)
+    return mismatches
+
+def bench_memory(puzzles, count = 100):
+    """Measures memory allocated per Sudoku object loaded from a puzzle, per clone() and per snapshot()
+
+    :param count: Number of objects measured together, memory is divided by it
+    :type count: int
+    :return: dict of bytes per object { kind : bytes }
+    """
+    sudoku = Sudoku(0, puzzle = puzzles[0])
+    factories = {
+        'sudoku': lambda k: Sudoku(0, puzzle = puzzles[k % len(puzzles)]),
+        'clone': lambda k: sudoku.clone(),
+        'snapshot': lambda k: sudoku.snapshot(),
+    }
+    results = {}
+    for kind, factory in factories.items():
+        tracemalloc.start()
+        objects = [factory(k) for k in range(count)]
+        results[kind] = tracemalloc.get_traced_memory()[0] / count
+        tracemalloc.stop()
+        del objects
+    return results
+
+def run_benchmarks(seed = 0, repeat = 100, solvers = None):
+    """Runs all benchmarks
+
+    :param seed: Seed of random generators, the same seed gives the same generated puzzles and edits
+    :type seed: int
+    :param repeat: Number of runs of generating, map_grid() and edits benchmarks
+    :type repeat: int
+    :param solvers: Names of compared solvers, None for all
+    :type solvers: list of str
+    :return: dict of results, see summarize()
+    """
+    if solvers is None:
+        solvers = ['backtracking'] + list(solverBackends)
+    allPuzzles = [puzzle for puzzles in corpora.values() for puzzle in puzzles]
+    results = {'seed': seed, 'repeat': repeat, 'generate': {}, 'solve': {}, 'stats': {}}
+
+    for solver in solvers:
+        results['generate'][solver] = bench_generate(repeat, 45, solver, Random(seed))
+        results['generate'][solver + ' unique'] = bench_generate(repeat, 45, solver, Random(seed), unique = True)
+        # Generating 16x16 puzzles is slower, so it is run less times
+        results['generate'][solver + ' 16x16 unique'] = bench_generate(max(1, repeat // 10), 120, solver, Random(seed), unique = True, boxSize = 4)
+
+    for name, puzzles in corpora.items():
+        results['solve'][name] = {'solve() steps': bench_step_wise(puzzles)}
+        for solver in solvers:
+            results['solve'][name][solver] = bench_solve(puzzles, solver)
+        results['stats'][name] = collect_stats(puzzles)
+
+    results['map_grid'] = bench_map_grid(repeat, allPuzzles)
+    results['user_edits'] = bench_user_edits(repeat, corpora['easy'], 50, Random(seed))
+    results['memory'] = bench_memory(allPuzzles)
+    return results
+
+def print_results(results, file = sys.stdout):
+    """Prints results of run_benchmarks() as a table"""
+    def print_row(name, summary):
+        line = name.ljust(32) + ('%.3f' % summary['mean_ms']).rjust(12) + ('%.3f' % summary['p50_ms']).rjust(12) + ('%.3f' % summary['p99_ms']).rjust(12)
+        if 'steps_per_s' in summary:
+            line += ('%.0f' % summary['steps_per_s']).rjust(14)
+        if 'solved' in summary:
+            line += ('%d/%d' % (summary['solved'], summary['runs'])).rjust(8)
+        print(line, file = file)
+
+    print(''.ljust(32) + 'mean ms'.rjust(12) + 'p50 ms'.rjust(12) + 'p99 ms'.rjust(12) + 'steps/s'.rjust(14) + 'solved'.rjust(8), file = file)
+    for solver, summary in results['generate'].items():
+        print_row('generate ' + solver, summary)
+    for name, solvers in results['solve'].items():
+        for solver, summary in solvers.items():
+            print_row('solve ' + name + ' ' + solver, summary)
+    print_row('map_grid', results['map_grid'])
+    print_row('50 user edits', results['user_edits'])
+    print('backtracking is stopped after %d steps' % maxBacktrackingSteps, file = file)
+
+    print(file = file)
+    for kind, size in results['memory'].items():
+        print(('bytes per ' + kind).ljust(32) + ('%.0f' % size).rjust(12), file = file)
+
+    print(file = file)
+    print('backtracking'.ljust(32) + 'steps'.rjust(12) + 'placements'.rjust(12) + 'backtracks'.rjust(12) + 'max depth'.rjust(10)
+          + 'clear ms'.rjust(10) + 'forward ms'.rjust(12) + 'back ms'.rjust(10), file = file)
+    for name, stats in results['stats'].items():
+        print(name.ljust(32) + str(stats['steps']).rjust(12) + str(stats['placements']).rjust(12) + str(stats['backtracks']).rjust(12)
+              + str(stats['max_depth']).rjust(10) + ('%.1f' % (1000 * stats['phase_s']['clear_errors'])).rjust(10)
+              + ('%.1f' % (1000 * stats['phase_s']['forward'])).rjust(12) + ('%.1f' % (1000 * stats['phase_s']['backtrack'])).rjust(10), file = file)
+
+def main(arguments = None):
+    """Runs benchmarks, prints a table and optionally writes results as JSON
+
+    :param arguments: Command line arguments, None for sys.argv
+    :type arguments: list of str
+    """
+    parser = ArgumentParser(description = "Benchmarks generating, solving and editing Sudoku grids")
+    parser.add_argument('--seed', type = int, default = 0, help = "seed of random generators")
+    parser.add_argument('--repeat', type = int, default = 100, help = "number of runs of repeated benchmarks")
+    parser.add_argument('--solver', action = 'append', choices = ['backtracking'] + list(solverBackends), help = "compared solver, all when not given")
+    parser.add_argument('--json', help = "file to write results as JSON to, '-' for standard output")
+    parser.add_argument('--check', type = int, metavar = 'COUNT', help = "instead of benchmarks, check that solve_full() and solve() "
+                        "agree on COUNT puzzles with random user edits")
+    arguments = parser.parse_args(arguments)
+
+    if arguments.check is not None:
+        mismatches = check_step_wise(arguments.check, 3, Random(arguments.seed))
+        print('%d of %d puzzles solved differently by solve_full() and solve()' % (len(mismatches), arguments.check))
+        for seed in mismatches:
+            print('  Sudoku(50, seed = %d)' % seed)
+        sys.exit(1 if mismatches else 0)
+
+    results = run_benchmarks(arguments.seed, arguments.repeat, arguments.solver)
+    if arguments.json == '-':
+        json.dump(results, sys.stdout, indent = 2)
+        print()
+    else:
+        print_results(results)
+        if arguments.json:
+            with open(arguments.json, 'w') as jsonFile:
+                json.dump(results, jsonFile, indent = 2)
+
+if __name__ == '__main__':
+    main()
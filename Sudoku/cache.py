@@ -0,0 +1,245 @@
+# Memoization of solutions of puzzles that are the same up to symmetry
+#
+# Symmetries of Sudoku are relabeling of digits, permutations of rows within a band, of bands,
+# of columns within a stack, of stacks and transposition. A puzzle is brought to a canonical form by ordering
+# bands, rows, stacks and columns by keys that do not change under these symmetries and by relabeling digits
+# in the order of their first appearance. Rows or columns with equal keys are tried in all orders and the smallest
+# form is taken, when there are too many such orders, the original order is kept. The canonical form is always
+# a transformation of the puzzle, so a cached solution is always correct, only some equivalent puzzles
+# with many equal keys may get different canonical forms.
+import os
+from collections import OrderedDict
+from itertools import permutations, product
+
+from sudoku import Sudoku, parse_puzzle, format_puzzle
+from units import SolveLimitReached, boxOfCell
+
+maxOrderings = 36 # maximal number of tried row orders and of tried column orders for one orientation
+
+def transpose(values):
+    """Returns flat list of values of the transposed grid"""
+    return [values[9*j + i] for i in range(9) for j in range(9)]
+
+def orderings(items, key):
+    """Returns all orders of items sorted by key in which items with equal keys are in any order
+
+    :return: list of lists of items
+    """
+    items = sorted(items, key = key)
+    groups = []
+    for item in items:
+        if groups and key(groups[-1][0]) == key(item):
+            groups[-1].append(item)
+        else:
+            groups.append([item])
+    return [[item for group in choice for item in group] for choice in product(*[list(permutations(group)) for group in groups])]
+
+def line_orders(lineKey):
+    """Returns orders of 9 rows (or columns) sorted by keys of their bands (stacks) and by their own keys
+
+    :param lineKey: Function returning key of a row by its index
+    :return: list of lists of 9 row indexes
+    """
+    bandKey = lambda band: sorted(lineKey(3*band + k) for k in range(3))
+    bandOrders = orderings(range(3), bandKey)
+    lineChoices = [orderings(range(3*band, 3*band + 3), lineKey) for band in range(3)]
+    count = len(bandOrders)
+    for choices in lineChoices:
+        count *= len(choices)
+    if count > maxOrderings:
+        return [[line for band in bandOrders[0] for line in lineChoices[band][0]]]
+    return [[line for lines in combination for line in lines]
+            for bandOrder in bandOrders for combination in product(*[lineChoices[band] for band in bandOrder])]
+
+def oriented_candidates(values):
+    """Yields tuples (rowOrder, columnOrder) of one orientation of the grid that are candidates for the canonical form"""
+    rowGivens = [sum(1 for j in range(9) if values[9*i + j]) for i in range(9)]
+    columnGivens = [sum(1 for i in range(9) if values[9*i + j]) for j in range(9)]
+    boxGivens = [0] * 9
+    digitCounts = [0] * 10
+    for cell, value in enumerate(values):
+        if value:
+            boxGivens[boxOfCell[cell // 9][cell % 9]] += 1
+            digitCounts[value] += 1
+
+    # Keys of a row and of a column do not change under the symmetries, except of transposition, which swaps them
+    rowKeys = [(rowGivens[i], sorted((columnGivens[j], boxGivens[boxOfCell[i][j]], digitCounts[values[9*i + j]])
+                                     for j in range(9) if values[9*i + j])) for i in range(9)]
+    columnKeys = [(columnGivens[j], sorted((rowGivens[i], boxGivens[boxOfCell[i][j]], digitCounts[values[9*i + j]])
+                                           for i in range(9) if values[9*i + j])) for j in range(9)]
+    for rowOrder in line_orders(rowKeys.__getitem__):
+        for columnOrder in line_orders(columnKeys.__getitem__):
+            yield (rowOrder, columnOrder)
+
+def canonical_form(puzzle):
+    """Finds canonical form of a puzzle
+
+    :param puzzle: String of cells row by row, see sudoku.parse_puzzle()
+    :type puzzle: str
+    :return: tuple (canonical puzzle string, transform), transform is used by restore_orientation()
+    """
+    values = parse_puzzle(puzzle, 9)
+    if len(values) != 81:
+        raise ValueError("Puzzle has " + str(len(values)) + " cells instead of 81")
+    best = None
+    for isTransposed in (False, True):
+        oriented = transpose(values) if isTransposed else values
+        for rowOrder, columnOrder in oriented_candidates(oriented):
+            # Digits are relabeled in the order of their first appearance
+            labels = [0] * 10
+            nextLabel = 1
+            form = []
+            for i in rowOrder:
+                for j in columnOrder:
+                    value = oriented[9*i + j]
+                    if value and not labels[value]:
+                        labels[value] = nextLabel
+                        nextLabel += 1
+                    form.append(labels[value])
+            if best is None or form < best[0]:
+                best = (form, isTransposed, rowOrder, columnOrder, labels)
+
+    form, isTransposed, rowOrder, columnOrder, labels = best
+    # Digits missing in the puzzle get the remaining labels
+    unused = iter(label for label in range(1, 10) if label not in labels)
+    labels = [0] + [labels[value] or next(unused) for value in range(1, 10)]
+    return (''.join(map(str, form)), (isTransposed, rowOrder, columnOrder, labels))
+
+def restore_orientation(canonicalGrid, transform):
+    """Transforms a grid in the canonical orientation, e.g. a solution of the canonical puzzle, back to the orientation of the puzzle
+
+    :param canonicalGrid: String of 81 digits
+    :type canonicalGrid: str
+    :param transform: Transform returned by canonical_form() together with the canonical puzzle
+    :return: String of 81 digits
+    """
+    isTransposed, rowOrder, columnOrder, labels = transform
+    digits = [0] * 10
+    for value in range(10):
+        digits[labels[value]] = value
+    values = [0] * 81
+    for r, i in enumerate(rowOrder):
+        for c, j in enumerate(columnOrder):
+            values[9*i + j] = digits[ord(canonicalGrid[9*r + c]) - 48]
+    return format_puzzle([transpose(values)[9*i:9*i + 9] for i in range(9)] if isTransposed else [values[9*i:9*i + 9] for i in range(9)])
+
+def canonical_orientation(grid, transform):
+    """Transforms a grid in the orientation of a puzzle, e.g. its solution, to the canonical orientation, inverse of restore_orientation()
+
+    :param grid: String of 81 digits
+    :type grid: str
+    :param transform: Transform returned by canonical_form() together with the canonical puzzle
+    :return: String of 81 digits
+    """
+    isTransposed, rowOrder, columnOrder, labels = transform
+    values = parse_puzzle(grid)
+    if isTransposed:
+        values = transpose(values)
+    return ''.join([str(labels[values[9*i + j]]) for i in rowOrder for j in columnOrder])
+
+class SolutionCache:
+    """SolutionCache remembers solutions of canonical forms of puzzles, so equivalent puzzles are solved only once
+
+    Least recently used solutions are dropped when there are more than maxSize of them.
+    Solutions can be saved to a file and loaded from it.
+    """
+    def __init__(self, maxSize = 10000, path = None):
+        """Initializes a SolutionCache object and loads solutions from path if the file exists
+
+        :param maxSize: Maximal number of remembered solutions
+        :type maxSize: int
+        :param path: File for saving solutions by save(), None for no persistence
+        :type path: str
+        """
+        self.maxSize = maxSize
+        self.path = path
+        self.solutions = OrderedDict() # { canonical puzzle : canonical solution }, least recently used first
+        self.hits = 0
+        self.misses = 0
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def __len__(self):
+        return len(self.solutions)
+
+    def lookup(self, canonicalPuzzle):
+        """Returns solution of a canonical puzzle or None when it is not cached"""
+        solution = self.solutions.get(canonicalPuzzle)
+        if solution is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.solutions.move_to_end(canonicalPuzzle)
+        return solution
+
+    def store(self, canonicalPuzzle, canonicalSolution):
+        """Remembers solution of a canonical puzzle and drops the least recently used one if the cache is full"""
+        self.solutions[canonicalPuzzle] = canonicalSolution
+        self.solutions.move_to_end(canonicalPuzzle)
+        while len(self.solutions) > self.maxSize:
+            self.solutions.popitem(last = False)
+
+    def get(self, puzzle):
+        """Returns cached solution of the puzzle in its orientation or None
+
+        :param puzzle: String of cells row by row, see sudoku.parse_puzzle()
+        :type puzzle: str
+        """
+        canonicalPuzzle, transform = canonical_form(puzzle)
+        solution = self.lookup(canonicalPuzzle)
+        return None if solution is None else restore_orientation(solution, transform)
+
+    def put(self, puzzle, solution):
+        """Remembers solution of the puzzle
+
+        :param puzzle: String of cells row by row, see sudoku.parse_puzzle()
+        :type puzzle: str
+        :param solution: String of 81 digits
+        :type solution: str
+        """
+        canonicalPuzzle, transform = canonical_form(puzzle)
+        self.store(canonicalPuzzle, canonical_orientation(solution, transform))
+
+    def solve(self, puzzle, solver = 'propagation', maxSteps = None, timeout = None):
+        """Returns solution of the puzzle, the puzzle is solved only when no equivalent puzzle is cached
+
+        :param puzzle: String of cells row by row, see sudoku.parse_puzzle()
+        :type puzzle: str
+        :param solver: Name of solver, see Sudoku
+        :type solver: str
+        :param maxSteps: Maximal number of solving steps, None for no limit, see Sudoku.solve_full()
+        :type maxSteps: int
+        :param timeout: Maximal solving time in seconds, None for no limit
+        :type timeout: float
+        :return: String of 81 digits or None when solution does not exist
+        :raises SolveLimitReached: when the puzzle was not solved within the limits
+        """
+        canonicalPuzzle, transform = canonical_form(puzzle)
+        solution = self.lookup(canonicalPuzzle)
+        if solution is None:
+            # The puzzle itself is solved, the backtracking may need far more steps for the reordered canonical puzzle
+            result = Sudoku(0, solver, puzzle = puzzle).solve_full(maxSteps, timeout)
+            if result.status == 1:
+                raise SolveLimitReached(result.steps, result.guesses)
+            if result.status != 0:
+                return None
+            solution = format_puzzle(result.grid)
+            self.store(canonicalPuzzle, canonical_orientation(solution, transform))
+            return solution
+        return restore_orientation(solution, transform)
+
+    def load(self):
+        """Loads solutions saved by save(), they are added as the most recently used ones"""
+        with open(self.path) as cacheFile:
+            for line in cacheFile:
+                parts = line.split()
+                if len(parts) == 2:
+                    self.store(parts[0], parts[1])
+
+    def save(self):
+        """Saves solutions to the file, one canonical puzzle and its solution per line"""
+        temporaryPath = self.path + '.tmp'
+        with open(temporaryPath, 'w') as cacheFile:
+            for puzzle, solution in self.solutions.items():
+                cacheFile.write(puzzle + ' ' + solution + '\n')
+        os.replace(temporaryPath, self.path)
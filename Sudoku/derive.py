@@ -0,0 +1,89 @@
+# Deriving many puzzles from one puzzle by transformations that keep Sudoku rules valid
+#
+# Permuting digits, rows within a band, bands, columns within a stack, stacks and transposing a grid
+# (rotations are transposition combined with reversing rows or columns) turns a valid puzzle into a valid puzzle
+# with the same number of solutions, and its solution into the solution of the new puzzle.
+# Puzzles are transformed as strings, see sudoku.format_puzzle(), so a derived puzzle costs only a few list operations.
+import random
+
+from units import symbols
+
+maxDuplicates = 1000 # deriving stops after this number of derived puzzles in a row that were already yielded
+
+def random_line_order(rng, boxSize):
+    """Returns random order of rows (or columns) which permutes bands (stacks) and rows within each of them
+
+    :return: list of boxSize^2 row indexes
+    """
+    bands = list(range(boxSize))
+    rng.shuffle(bands)
+    order = []
+    for band in bands:
+        lines = list(range(boxSize * band, boxSize * band + boxSize))
+        rng.shuffle(lines)
+        order += lines
+    return order
+
+def random_transform(rng, boxSize = 3):
+    """Returns a random transformation of grids with the given box size
+
+    :param rng: Random generator
+    :type rng: random.Random
+    :return: tuple (order, table) where order is list of indexes of cells of the original string in the order
+        of the transformed one and table is str.translate() table relabeling digits
+    """
+    size = boxSize * boxSize
+    rowOrder = random_line_order(rng, boxSize)
+    columnOrder = random_line_order(rng, boxSize)
+    if rng.random() < 0.5:
+        order = [size*j + i for i in rowOrder for j in columnOrder] # transposed
+    else:
+        order = [size*i + j for i in rowOrder for j in columnOrder]
+    digits = list(symbols[1:size + 1])
+    rng.shuffle(digits)
+    return (order, str.maketrans(symbols[1:size + 1], ''.join(digits)))
+
+def apply_transform(puzzle, transform):
+    """Transforms a puzzle or solution string by a transformation returned by random_transform()"""
+    order, table = transform
+    return ''.join(map(puzzle.__getitem__, order)).translate(table)
+
+def derive_puzzles(puzzle, solution = None, count = None, rng = None, boxSize = 3, distinct = True):
+    """Yields puzzles derived from the given puzzle by random transformations
+
+    Derived puzzles keep the number of solutions of the puzzle, so a puzzle with a unique solution gives puzzles with a unique solution.
+    :param puzzle: String of size^2 characters without whitespace, see sudoku.format_puzzle()
+    :type puzzle: str
+    :param solution: Solution of the puzzle, it is transformed together with the puzzle, None for deriving only puzzles
+    :type solution: str
+    :param count: Number of derived puzzles, None for an endless generator
+    :type count: int
+    :param rng: Random generator, None for the module level one
+    :type rng: random.Random
+    :param boxSize: Box size of the puzzle
+    :type boxSize: int
+    :param distinct: True for skipping derived puzzles that were already yielded, it keeps all yielded puzzles in memory
+    :type distinct: bool
+    :return: generator of puzzle strings or of tuples (puzzle, solution) when solution is given
+    """
+    size = boxSize * boxSize
+    if len(puzzle) != size * size or (solution is not None and len(solution) != size * size):
+        raise ValueError("Puzzle and solution must have " + str(size * size) + " cells")
+    rng = random if rng is None else rng
+    seen = set()
+    derived = 0
+    duplicates = 0
+    while count is None or derived < count:
+        transform = random_transform(rng, boxSize)
+        newPuzzle = apply_transform(puzzle, transform)
+        if distinct:
+            if newPuzzle in seen:
+                # Highly symmetric puzzles, e.g. an empty grid, have only a few distinct transformations
+                duplicates += 1
+                if duplicates == maxDuplicates:
+                    return
+                continue
+            seen.add(newPuzzle)
+            duplicates = 0
+        derived += 1
+        yield newPuzzle if solution is None else (newPuzzle, apply_transform(solution, transform))
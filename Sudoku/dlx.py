@@ -0,0 +1,267 @@
+from time import perf_counter
+
+from units import SolveLimitReached, get_tables
+
+class DLXSolver:
+    """Solver that models Sudoku as an exact cover problem and solves it by Dancing Links (Algorithm X)
+
+    For 9x9 grid matrix has 729 rows, one for each number in each cell, and 324 columns for constraints:
+    each cell, each number in each row, each number in each column and each number in each box is used exactly once.
+    Nodes are stored in flat lists of links, node 0 is the root, nodes 1-324 are column headers
+    and row r (= 9*cell + number - 1) has 4 nodes starting at firstRowNode + 4*r. Other grid sizes are analogous.
+    The matrix of each box size is built once and shared by all instances, givens of a grid are covered before search and uncovered after it.
+    """
+    name = 'dlx'
+    templates = {} # { boxSize : tuple of lists returned by build_matrix() }
+
+    def __init__(self, boxSize = 3):
+        """Initializes a DLXSolver object with its own copy of the exact cover matrix
+
+        :param boxSize: Number of rows and columns of a box of solved grids, 3 for 9x9 grids
+        :type boxSize: int
+        """
+        self.tables = get_tables(boxSize)
+        self.firstRowNode = 4 * self.tables.cellCount + 1
+        if boxSize not in DLXSolver.templates:
+            DLXSolver.templates[boxSize] = DLXSolver.build_matrix(self.tables)
+        left, right, up, down, column, size = DLXSolver.templates[boxSize]
+        self.left = left[:]
+        self.right = right[:]
+        self.up = up[:]
+        self.down = down[:]
+        self.column = column[:]
+        self.size = size[:]
+        self.steps = 0
+        self.guesses = 0
+        self.stepLimit = -1 # -1 for no limit, see solve()
+        self.deadline = None
+
+    @staticmethod
+    def build_matrix(tables):
+        """Builds links of the Sudoku exact cover matrix
+
+        :param tables: Tables of the grid, see units.get_tables()
+        :type tables: units.GridTables
+        :return: tuple of lists (left, right, up, down, column, size)
+        """
+        n = tables.size
+        cellCount = tables.cellCount
+        headers = 4 * cellCount + 1
+        left = [i - 1 for i in range(headers)]
+        right = [i + 1 for i in range(headers)]
+        left[0] = headers - 1
+        right[headers - 1] = 0
+        up = list(range(headers))
+        down = list(range(headers))
+        column = list(range(headers))
+        size = [0] * headers
+
+        for row in range(cellCount * n):
+            cell, indexN = divmod(row, n)
+            i, j = divmod(cell, n)
+            b = tables.cellBox[cell]
+            first = len(left)
+            for k, c in enumerate((1 + cell, 1 + cellCount + n*i + indexN, 1 + 2*cellCount + n*j + indexN, 1 + 3*cellCount + n*b + indexN)):
+                node = first + k
+                left.append(first + (k + 3) % 4)
+                right.append(first + (k + 1) % 4)
+                up.append(up[c])
+                down.append(c)
+                down[up[c]] = node
+                up[c] = node
+                column.append(c)
+                size[c] += 1
+        return (left, right, up, down, column, size)
+
+    def cover(self, c):
+        """Removes column c from the header list and all rows that use it from other columns"""
+        left, right, up, down, column, size = self.left, self.right, self.up, self.down, self.column, self.size
+        right[left[c]] = right[c]
+        left[right[c]] = left[c]
+        i = down[c]
+        while i != c:
+            j = right[i]
+            while j != i:
+                down[up[j]] = down[j]
+                up[down[j]] = up[j]
+                size[column[j]] -= 1
+                j = right[j]
+            i = down[i]
+
+    def uncover(self, c):
+        """Reverts cover(c)"""
+        left, right, up, down, column, size = self.left, self.right, self.up, self.down, self.column, self.size
+        i = up[c]
+        while i != c:
+            j = left[i]
+            while j != i:
+                size[column[j]] += 1
+                down[up[j]] = j
+                up[down[j]] = j
+                j = left[j]
+            i = up[i]
+        right[left[c]] = c
+        left[right[c]] = c
+
+    def cover_row(self, r):
+        """Covers all other columns of the row of node r"""
+        j = self.right[r]
+        while j != r:
+            self.cover(self.column[j])
+            j = self.right[j]
+
+    def uncover_row(self, r):
+        """Reverts cover_row(r)"""
+        j = self.left[r]
+        while j != r:
+            self.uncover(self.column[j])
+            j = self.left[j]
+
+    def search(self):
+        """Yields list of selected row nodes for every exact cover of the remaining columns
+
+        The search is iterative, so it can be paused between solutions. State of the matrix is restored
+        when the search is finished, when the generator is closed or when SolveLimitReached is raised.
+        """
+        right, down, column, size = self.right, self.down, self.column, self.size
+        stepLimit, deadline = self.stepLimit, self.deadline
+        choice = []
+        try:
+            while True:
+                # Every selected row has its columns covered here, so the search can be stopped
+                if self.steps == stepLimit or (deadline is not None and not self.steps & 1023 and perf_counter() > deadline):
+                    raise SolveLimitReached(self.steps, self.guesses)
+                if right[0] == 0:
+                    yield choice
+                    if not choice:
+                        return
+                    r = choice.pop()
+                    self.uncover_row(r)
+                    c = column[r]
+                    r = down[r]
+                else:
+                    # Chooses column with the fewest rows
+                    c = right[0]
+                    best = c
+                    bestSize = size[c]
+                    c = right[c]
+                    while c and bestSize > 1:
+                        if size[c] < bestSize:
+                            best = c
+                            bestSize = size[c]
+                        c = right[c]
+                    c = best
+                    self.cover(c)
+                    r = down[c]
+
+                # If there are no more rows in the column, backtrack
+                while r == c:
+                    self.uncover(c)
+                    if not choice:
+                        return
+                    r = choice.pop()
+                    self.uncover_row(r)
+                    c = column[r]
+                    r = down[r]
+
+                self.steps += 1
+                if size[c] > 1:
+                    self.guesses += 1
+                choice.append(r)
+                self.cover_row(r)
+        finally:
+            # Restores the matrix when the generator is closed before the search has finished
+            while choice:
+                r = choice.pop()
+                self.uncover_row(r)
+                self.uncover(column[r])
+
+    def iterate_solutions(self, grid, countOnly = False):
+        """Yields solutions of the given Sudoku grid one by one
+
+        The same list is reused for every yielded solution, so it has to be copied when it needs to be kept.
+        :param grid: Sudoku grid, 0 for empty cell, it is not changed
+        :type grid: list of lists of int
+        :param countOnly: True for yielding None for every solution instead of filling in its values
+        :type countOnly: bool
+        :return: generator of flat lists of values
+        """
+        n = self.tables.size
+        values = [value for row in grid for value in row]
+        givens = []
+        try:
+            for cell in range(self.tables.cellCount):
+                if values[cell]:
+                    r = self.firstRowNode + 4*(n*cell + values[cell] - 1)
+                    # Given number breaks a constraint that has been already covered by other given
+                    if self.right[self.left[self.column[r]]] != self.column[r] or any(
+                            self.right[self.left[self.column[node]]] != self.column[node] for node in (r + 1, r + 2, r + 3)):
+                        return
+                    self.cover(self.column[r])
+                    self.cover_row(r)
+                    givens.append(r)
+
+            search = self.search()
+            try:
+                for choice in search:
+                    if countOnly:
+                        yield None
+                        continue
+                    for r in choice:
+                        cell, indexN = divmod((r - self.firstRowNode) // 4, n)
+                        values[cell] = indexN + 1
+                    yield values
+            finally:
+                search.close()
+        finally:
+            for r in reversed(givens):
+                self.uncover_row(r)
+                self.uncover(self.column[r])
+
+    def solve(self, grid, maxSteps = None, deadline = None):
+        """Finds a solution of the given Sudoku grid
+
+        :param grid: Sudoku grid, 0 for empty cell, it is not changed
+        :type grid: list of lists of int
+        :param maxSteps: Maximal number of steps after which solving is stopped, None for no limit
+        :type maxSteps: int
+        :param deadline: perf_counter() time after which solving is stopped, None for no limit
+        :type deadline: float
+        :return: tuple (solved grid or None when solution does not exist, number of steps, number of guesses)
+        :raises SolveLimitReached: when a limit is reached
+        """
+        self.steps = 0
+        self.guesses = 0
+        self.stepLimit = -1 if maxSteps is None else maxSteps
+        self.deadline = deadline
+        solutions = self.iterate_solutions(grid)
+        try:
+            solution = next(solutions, None)
+        finally:
+            solutions.close()
+            self.stepLimit = -1
+            self.deadline = None
+        if solution is None:
+            return (None, self.steps, self.guesses)
+        n = self.tables.size
+        return ([solution[n*i:n*i + n] for i in range(n)], self.steps, self.guesses)
+
+    def count_solutions(self, grid, limit = None):
+        """Counts solutions of the given Sudoku grid
+
+        :param grid: Sudoku grid, 0 for empty cell, it is not changed
+        :type grid: list of lists of int
+        :param limit: Counting stops when limit solutions are found, None for no limit
+        :type limit: int
+        :return: number of solutions, at most limit
+        """
+        self.steps = 0
+        self.guesses = 0
+        count = 0
+        solutions = self.iterate_solutions(grid, countOnly = True)
+        for _ in solutions:
+            count += 1
+            if count == limit:
+                break
+        solutions.close()
+        return count
@@ -0,0 +1,99 @@
+from collections import deque
+from random import Random
+from threading import Condition, Thread
+
+from sudoku import Sudoku
+
+class PuzzlePool:
+    """PuzzlePool pre-generates Sudoku puzzles in a background thread, so a new puzzle can be handed out instantly
+
+    For every difficulty (number of cells to leave empty) at most size puzzles are kept,
+    the pool refills itself whenever a puzzle is taken. It does not depend on the GUI.
+    """
+    def __init__(self, difficulties, size = 4, solver = 'backtracking', unique = False, seed = None):
+        """Initializes a PuzzlePool object and starts generating in the background
+
+        :param difficulties: Numbers of cells to leave empty for which puzzles are pre-generated
+        :type difficulties: list of int
+        :param size: Maximal number of pre-generated puzzles of one difficulty
+        :type size: int
+        :param solver: Name of solver used for generating, see Sudoku
+        :type solver: str
+        :param unique: True for generating only puzzles with a unique solution
+        :type unique: bool
+        :param seed: Seed of random generator of the background thread, None for a random one
+        :type seed: int or str
+        """
+        self.size = size
+        self.solver = solver
+        self.unique = unique
+        self.random = Random(seed)
+
+        # Pre-generated Sudoku objects for each difficulty { numberOfCellsToLeaveEmpty : deque of Sudoku }
+        self.puzzles = {difficulty: deque() for difficulty in difficulties}
+
+        # Guards puzzles and isRunning, the background thread waits on it when all puzzles are generated
+        self.condition = Condition()
+        self.isRunning = True
+        self.thread = Thread(target = self.fill, name = "PuzzlePool", daemon = True)
+        self.thread.start()
+
+    def find_missing(self):
+        """Returns a difficulty with less than size puzzles or None if the pool is full, must be called with condition held"""
+        for difficulty, puzzles in self.puzzles.items():
+            if len(puzzles) < self.size:
+                return difficulty
+        return None
+
+    def fill(self):
+        """Generates missing puzzles until the pool is closed, runs in the background thread"""
+        while True:
+            with self.condition:
+                difficulty = self.find_missing()
+                while self.isRunning and difficulty is None:
+                    self.condition.wait()
+                    difficulty = self.find_missing()
+                if not self.isRunning:
+                    return
+
+            # Generates without holding the lock, so get() is never blocked by generating
+            sudoku = Sudoku(difficulty, self.solver, self.unique, seed = self.random)
+
+            with self.condition:
+                if difficulty in self.puzzles:
+                    self.puzzles[difficulty].append(sudoku)
+
+    def get(self, numberOfCellsToLeaveEmpty):
+        """Hands out a pre-generated puzzle of the given difficulty
+
+        When no puzzle of the difficulty is ready, it is generated in the calling thread,
+        and the difficulty is pre-generated from then on.
+        :param numberOfCellsToLeaveEmpty: Determins how many cells should be left out empty
+        :type numberOfCellsToLeaveEmpty: int
+        :return: Sudoku object
+        """
+        with self.condition:
+            puzzles = self.puzzles.setdefault(numberOfCellsToLeaveEmpty, deque())
+            sudoku = puzzles.popleft() if puzzles else None
+            self.condition.notify()
+        if sudoku is None:
+            sudoku = Sudoku(numberOfCellsToLeaveEmpty, self.solver, self.unique)
+        return sudoku
+
+    def available(self, numberOfCellsToLeaveEmpty):
+        """Returns number of pre-generated puzzles of the given difficulty"""
+        with self.condition:
+            return len(self.puzzles.get(numberOfCellsToLeaveEmpty, ()))
+
+    def close(self):
+        """Stops the background thread"""
+        with self.condition:
+            self.isRunning = False
+            self.condition.notify()
+        self.thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exceptionInfo):
+        self.close()
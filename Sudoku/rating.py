@@ -0,0 +1,339 @@
+# Rating difficulty of puzzles by solving techniques a human solver needs
+#
+# DifficultyRater solves a puzzle with a ladder of techniques ordered from the easiest one. After every successful
+# application it starts again from the bottom of the ladder, so a technique is used only when all easier ones are stuck.
+# The hardest used technique determines the difficulty band of the puzzle and the score sums weights of all applications.
+# When all techniques are stuck, the rater guesses: it fills in the correct number of the cell with the fewest candidates.
+from itertools import combinations
+
+from solvers import PropagationSolver
+from units import get_tables
+
+# Ladder of techniques from the easiest one, (name, weight added to the score by every application)
+techniques = (
+    ('hidden single', 1),
+    ('naked single', 2),
+    ('locked candidates', 6),
+    ('naked pair', 8),
+    ('hidden pair', 10),
+    ('naked triple', 14),
+    ('hidden triple', 16),
+    ('x-wing', 20),
+    ('xy-wing', 24),
+    ('swordfish', 30),
+    ('guess', 50),
+)
+techniqueNames = [name for name, _ in techniques]
+
+# Difficulty bands from the easiest one, (name, hardest technique of the band)
+difficultyBands = (
+    ('easy', 'naked single'),
+    ('medium', 'hidden pair'),
+    ('hard', 'swordfish'),
+    ('expert', 'guess'),
+)
+difficulties = [name for name, _ in difficultyBands]
+
+def difficulty_of_level(level):
+    """Returns name of the difficulty band of the hardest technique given by its index in techniques"""
+    for name, hardest in difficultyBands:
+        if level <= techniqueNames.index(hardest):
+            return name
+    return difficultyBands[-1][0]
+
+class Rating:
+    """Difficulty rating of a puzzle, see DifficultyRater.rate()"""
+    technique : str
+    level : int
+    score : int
+    difficulty : str
+    counts : dict
+
+    def __init__(self, level, score, counts):
+        """Initializes a Rating object
+
+        :param level: Index of the hardest used technique in techniques, -1 for a full grid
+        :type level: int
+        :param score: Sum of weights of all technique applications
+        :type score: int
+        :param counts: Number of applications of each technique { technique name : count }, unused techniques are left out
+        :type counts: dict
+        """
+        self.technique = techniqueNames[level] if level >= 0 else None
+        self.level = level
+        self.score = score
+        self.difficulty = difficulty_of_level(level)
+        self.counts = counts
+
+    def to_dict(self):
+        """Returns rating as a dict, which can be written as JSON"""
+        return {
+            'difficulty': self.difficulty,
+            'technique': self.technique,
+            'score': self.score,
+            'counts': dict(self.counts),
+        }
+
+class DifficultyRater:
+    """Rates puzzles by the techniques needed to solve them, one object can rate any number of puzzles of one grid size
+
+    Candidates of every cell are kept as bitmasks, bit x stands for number x + 1, filled cells have no candidates.
+    """
+    def __init__(self, boxSize = 3):
+        """Initializes a DifficultyRater object
+
+        :param boxSize: Number of rows and columns of a box of rated grids, 3 for 9x9 grids
+        :type boxSize: int
+        """
+        tables = get_tables(boxSize)
+        self.tables = tables
+        self.solver = PropagationSolver(boxSize) # finds the solution used for guessing
+        self.peerSets = [set(peers) for peers in tables.peers]
+
+        # Intersections of boxes with rows and columns, tuples (cells of both, other cells of the box, other cells of the line)
+        self.intersections = []
+        for box in tables.boxCells:
+            boxSet = set(box)
+            for line in [tables.rowCells[tables.cellRow[cell]] for cell in box[::boxSize]] \
+                        + [tables.columnCells[tables.cellColumn[cell]] for cell in box[:boxSize]]:
+                both = [cell for cell in line if cell in boxSet]
+                self.intersections.append((both, [cell for cell in box if cell not in both], [cell for cell in line if cell not in boxSet]))
+
+        # Techniques in the order of techniques, every one returns number of its applications, 0 when it is stuck
+        self.ladder = (
+            self.hidden_singles,
+            self.naked_singles,
+            self.locked_candidates,
+            lambda: self.naked_subsets(2),
+            lambda: self.hidden_subsets(2),
+            lambda: self.naked_subsets(3),
+            lambda: self.hidden_subsets(3),
+            lambda: self.fish(2),
+            self.xy_wings,
+            lambda: self.fish(3),
+            self.guess,
+        )
+
+    def rate(self, grid):
+        """Solves the given Sudoku grid by the ladder of techniques and rates it
+
+        :param grid: Sudoku grid, 0 for empty cell, it is not changed
+        :type grid: list of lists of int
+        :return: Rating object
+        """
+        tables = self.tables
+        values = [value for row in grid for value in row]
+        if len(values) != tables.cellCount:
+            raise ValueError("Puzzle has " + str(len(values)) + " cells instead of " + str(tables.cellCount))
+        self.grid = grid
+        self.solution = None
+        self.values = [0] * tables.cellCount
+        self.candidates = [tables.fullMask] * tables.cellCount
+        self.emptyCells = tables.cellCount
+        for cell, value in enumerate(values):
+            if value:
+                if not self.candidates[cell] >> (value - 1) & 1:
+                    raise ValueError("Puzzle contains duplicit values")
+                self.place(cell, value)
+
+        counts = [0] * len(techniques)
+        while self.emptyCells:
+            for level, technique in enumerate(self.ladder):
+                applications = technique()
+                if applications:
+                    counts[level] += applications
+                    break
+        level = max((level for level, count in enumerate(counts) if count), default = -1)
+        score = sum(count * weight for count, (_, weight) in zip(counts, techniques))
+        return Rating(level, score, {techniqueNames[level]: count for level, count in enumerate(counts) if count})
+
+    def place(self, cell, value):
+        """Fills in a cell and removes its number from candidates of its peers"""
+        bit = 1 << (value - 1)
+        candidates = self.candidates
+        self.values[cell] = value
+        candidates[cell] = 0
+        for peer in self.tables.peers[cell]:
+            candidates[peer] &= ~bit
+        self.emptyCells -= 1
+
+    def eliminate(self, cells, mask):
+        """Removes numbers of the mask from candidates of the cells
+
+        :return: True if any candidate was removed
+        """
+        candidates = self.candidates
+        removed = False
+        for cell in cells:
+            if candidates[cell] & mask:
+                candidates[cell] &= ~mask
+                removed = True
+        return removed
+
+    def hidden_singles(self):
+        """Fills in numbers with only one possible cell in a row, column or box"""
+        candidates = self.candidates
+        applications = 0
+        for unit in self.tables.units:
+            once = 0
+            twice = 0
+            for cell in unit:
+                twice |= once & candidates[cell]
+                once |= candidates[cell]
+            singles = once & ~twice
+            while singles:
+                bit = singles & -singles
+                singles ^= bit
+                for cell in unit:
+                    if candidates[cell] & bit:
+                        self.place(cell, bit.bit_length())
+                        applications += 1
+                        break
+        return applications
+
+    def naked_singles(self):
+        """Fills in cells with only one candidate"""
+        candidates, values = self.candidates, self.values
+        applications = 0
+        for cell in range(self.tables.cellCount):
+            if not values[cell]:
+                mask = candidates[cell]
+                if not mask:
+                    raise ValueError("Puzzle has no solution")
+                if mask & (mask - 1) == 0:
+                    self.place(cell, mask.bit_length())
+                    applications += 1
+        return applications
+
+    def locked_candidates(self):
+        """Removes candidates by pointing (a number of a box is only in one of its lines) and by claiming
+        (a number of a line is only in one box)"""
+        candidates = self.candidates
+        applications = 0
+        for both, boxRest, lineRest in self.intersections:
+            shared = 0
+            for cell in both:
+                shared |= candidates[cell]
+            if not shared:
+                continue
+            boxOthers = 0
+            for cell in boxRest:
+                boxOthers |= candidates[cell]
+            lineOthers = 0
+            for cell in lineRest:
+                lineOthers |= candidates[cell]
+            pointing = shared & ~boxOthers & lineOthers
+            if pointing and self.eliminate(lineRest, pointing):
+                applications += pointing.bit_count()
+            claiming = shared & ~lineOthers & boxOthers
+            if claiming and self.eliminate(boxRest, claiming):
+                applications += claiming.bit_count()
+        return applications
+
+    def naked_subsets(self, subsetSize):
+        """Removes candidates of subsetSize cells of a unit which together have only subsetSize candidates from other cells of the unit"""
+        candidates = self.candidates
+        applications = 0
+        for unit in self.tables.units:
+            cells = [cell for cell in unit if 2 <= candidates[cell].bit_count() <= subsetSize]
+            if len(cells) < subsetSize:
+                continue
+            for subset in combinations(cells, subsetSize):
+                mask = 0
+                for cell in subset:
+                    mask |= candidates[cell]
+                if mask.bit_count() == subsetSize and self.eliminate([cell for cell in unit if cell not in subset], mask):
+                    applications += 1
+        return applications
+
+    def hidden_subsets(self, subsetSize):
+        """Removes other candidates from subsetSize cells of a unit which are the only possible cells of subsetSize numbers"""
+        candidates = self.candidates
+        applications = 0
+        for unit in self.tables.units:
+            # Bitmask of possible positions in the unit of every number with 2 to subsetSize of them
+            positions = {}
+            for number in range(self.tables.size):
+                bit = 1 << number
+                mask = 0
+                for k, cell in enumerate(unit):
+                    if candidates[cell] & bit:
+                        mask |= 1 << k
+                if 2 <= mask.bit_count() <= subsetSize:
+                    positions[bit] = mask
+            if len(positions) < subsetSize:
+                continue
+            for subset in combinations(positions, subsetSize):
+                mask = 0
+                for bit in subset:
+                    mask |= positions[bit]
+                if mask.bit_count() == subsetSize:
+                    numbers = sum(subset)
+                    cells = [cell for k, cell in enumerate(unit) if mask >> k & 1]
+                    if self.eliminate(cells, ~numbers & self.tables.fullMask):
+                        applications += 1
+        return applications
+
+    def fish(self, fishSize):
+        """Removes a number from fishSize columns when it is possible only in them in fishSize rows, and vice versa
+        (X-wing for 2 rows, swordfish for 3 rows)"""
+        tables = self.tables
+        candidates = self.candidates
+        applications = 0
+        for number in range(tables.size):
+            bit = 1 << number
+            for baseLines, coverLines in ((tables.rowCells, tables.columnCells), (tables.columnCells, tables.rowCells)):
+                # Bitmask of possible positions of the number in every base line with 2 to fishSize of them
+                positions = {}
+                for index, line in enumerate(baseLines):
+                    mask = 0
+                    for k, cell in enumerate(line):
+                        if candidates[cell] & bit:
+                            mask |= 1 << k
+                    if 2 <= mask.bit_count() <= fishSize:
+                        positions[index] = mask
+                if len(positions) < fishSize:
+                    continue
+                for subset in combinations(positions, fishSize):
+                    mask = 0
+                    for index in subset:
+                        mask |= positions[index]
+                    if mask.bit_count() == fishSize:
+                        # k-th cell of a base line lies in the k-th cover line, index-th cell of a cover line lies in index-th base line
+                        cells = [cell for k in range(tables.size) if mask >> k & 1
+                                 for index, cell in enumerate(coverLines[k]) if index not in subset]
+                        if self.eliminate(cells, bit):
+                            applications += 1
+        return applications
+
+    def xy_wings(self):
+        """Removes number c from common peers of two cells with candidates (a, c) and (b, c) that are peers of a cell
+        with candidates (a, b), one of the two cells must contain c"""
+        candidates = self.candidates
+        applications = 0
+        for pivot in range(self.tables.cellCount):
+            pivotMask = candidates[pivot]
+            if pivotMask.bit_count() != 2:
+                continue
+            wings = [cell for cell in self.tables.peers[pivot] if candidates[cell].bit_count() == 2
+                     and (candidates[cell] & pivotMask).bit_count() == 1]
+            for first, second in combinations(wings, 2):
+                third = candidates[first] & ~pivotMask
+                if third != candidates[second] & ~pivotMask or candidates[first] == candidates[second]:
+                    continue
+                common = [cell for cell in self.tables.peers[first] if cell in self.peerSets[second] and cell != pivot]
+                if self.eliminate(common, third):
+                    applications += 1
+        return applications
+
+    def guess(self):
+        """Fills in the correct number of the cell with the fewest candidates, the solution is found on the first guess"""
+        if self.solution is None:
+            solution = self.solver.solve(self.grid)[0]
+            if solution is None:
+                raise ValueError("Puzzle has no solution")
+            self.solution = [value for row in solution for value in row]
+        candidates = self.candidates
+        cell = min((cell for cell in range(self.tables.cellCount) if not self.values[cell]), key = lambda cell: candidates[cell].bit_count())
+        self.place(cell, self.solution[cell])
+        return 1
@@ -0,0 +1,352 @@
+# Headless server generating, solving and checking Sudoku puzzles for many clients
+#
+# Protocol: every request is one line with a JSON object and every response is one line with a JSON object
+# with the same "id". Requests of one connection are processed concurrently, so responses may come in a different order.
+# - {"id": 1, "method": "generate", "empty": 45, "solver": "backtracking", "unique": false, "seed": 7}
+#       -> {"id": 1, "puzzle": "...", "solution": "...", "seed": 7}, all parameters except method are optional
+# - {"id": 2, "method": "solve", "puzzle": "...", "solver": "propagation"} -> {"id": 2, "solution": "..." or null},
+#       a puzzle not solved in solveTimeout seconds gets an error
+# - {"id": 3, "method": "validate", "puzzle": "..."} -> {"id": 3, "valid": true, "complete": false, "conflicts": [], "unique": true}
+# - {"id": 4, "method": "hint", "puzzle": "..."} -> {"id": 4, "cell": [i, j], "value": 5, "reason": "naked single"}
+# Invalid requests get {"id": ..., "error": "message"}.
+#
+# CPU work runs in worker processes. Concurrent requests of the same method and options are collected
+# for a short time and sent to a worker as one batch, so many small requests do not pay the inter-process overhead each.
+import asyncio
+import json
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from os import cpu_count
+
+from cache import SolutionCache
+from solvers import solverBackends
+from sudoku import Sudoku, format_puzzle, parse_puzzle, seed_worker
+from units import SolveLimitReached
+
+def generate_batch(options, seeds):
+    """Generates a puzzle for every seed in a worker process
+
+    :param options: tuple (numberOfCellsToLeaveEmpty, solver, unique)
+    :param seeds: list of seeds, None for a random puzzle
+    :return: list of results
+    """
+    numberOfCellsToLeaveEmpty, solver, unique = options
+    results = []
+    for seed in seeds:
+        sudoku = Sudoku(numberOfCellsToLeaveEmpty, solver, unique, seed = seed)
+        results.append({'puzzle': format_puzzle(sudoku.grid), 'solution': format_puzzle(sudoku.solution), 'seed': seed})
+    return results
+
+# Solutions of puzzles solved by a worker process, puzzles equivalent to already solved ones are not solved again
+solutionCache = SolutionCache()
+
+# Maximal time in seconds spent solving one puzzle of a solve request, so a hard puzzle does not block a worker
+solveTimeout = 1.0
+
+def solve_batch(options, puzzles):
+    """Solves puzzles in a worker process
+
+    :param options: tuple (solver,)
+    :return: list of results
+    """
+    results = []
+    for puzzle in puzzles:
+        try:
+            results.append({'solution': solutionCache.solve(puzzle, options[0], timeout = solveTimeout)})
+        except SolveLimitReached as error:
+            results.append({'error': "Puzzle was not solved in " + str(solveTimeout) + " s, " + str(error)})
+    return results
+
+def validate_batch(options, puzzles):
+    """Checks puzzles for repeating numbers and counts their solutions up to 2 in a worker process
+
+    :return: list of results
+    """
+    results = []
+    for puzzle in puzzles:
+        sudoku = Sudoku(0, 'propagation', puzzle = puzzle)
+        conflicts = sudoku.find_conflicts()
+        result = {'valid': not conflicts, 'complete': not sudoku.cellsToSolve, 'conflicts': conflicts}
+        if not conflicts:
+            result['unique'] = sudoku.count_solutions(2) == 1
+        results.append(result)
+    return results
+
+def hint_batch(options, puzzles):
+    """Finds a hint for every puzzle in a worker process
+
+    Hint is a naked or hidden single or the empty cell with the fewest possible numbers and its number in the solution, see Sudoku.hint().
+    :return: list of results
+    """
+    results = []
+    for puzzle in puzzles:
+        sudoku = Sudoku(0, 'propagation', puzzle = puzzle)
+        if not sudoku.cellsToSolve:
+            results.append({'error': "Puzzle has no empty cell"})
+            continue
+        # Givens are prefilled, so their conflicts are not in errorCells and hint() would not see them
+        if sudoku.find_conflicts():
+            results.append({'error': "Puzzle has repeating numbers"})
+            continue
+        try:
+            hint = sudoku.hint()
+        except ValueError as error:
+            results.append({'error': str(error)})
+            continue
+        results.append({'cell': list(hint.cell), 'value': hint.value, 'reason': hint.reason})
+    return results
+
+# Functions processing batches of requests in worker processes { method : function(options, items) -> list of results }
+batchFunctions = {
+    'generate': generate_batch,
+    'solve': solve_batch,
+    'validate': validate_batch,
+    'hint': hint_batch,
+}
+
+def parse_request(request):
+    """Checks parameters of a request
+
+    :param request: decoded JSON request
+    :type request: dict
+    :return: tuple (method, options, item) where requests with the same method and options can be processed in one batch
+    """
+    if not isinstance(request, dict):
+        raise ValueError("Request must be a JSON object")
+    method = request.get('method')
+    if method == 'generate':
+        empty = request.get('empty', 45)
+        solver = request.get('solver', 'backtracking')
+        seed = request.get('seed')
+        # JSON true and false are decoded as bool, which is a subclass of int
+        if not isinstance(empty, int) or isinstance(empty, bool) or not 0 <= empty <= 81:
+            raise ValueError("Number of empty cells must be between 0 and 81")
+        if seed is not None and (not isinstance(seed, (int, str)) or isinstance(seed, bool)):
+            raise ValueError("Seed must be an integer or a string")
+        check_solver(solver)
+        return (method, (empty, solver, bool(request.get('unique', False))), seed)
+
+    if method in batchFunctions:
+        puzzle = request.get('puzzle')
+        if not isinstance(puzzle, str):
+            raise ValueError("Puzzle must be a string of 81 cells")
+        values = parse_puzzle(puzzle, 9)
+        if len(values) != 81:
+            raise ValueError("Puzzle has " + str(len(values)) + " cells instead of 81")
+        puzzle = ''.join(map(str, values))
+        if method == 'solve':
+            solver = request.get('solver', 'propagation')
+            check_solver(solver)
+            # Backtracking would never finish a puzzle with repeating givens
+            if solver == 'backtracking' and Sudoku(0, puzzle = puzzle).find_conflicts():
+                raise ValueError("Puzzle has repeating numbers")
+            return (method, (solver,), puzzle)
+        return (method, (), puzzle)
+
+    raise ValueError("Unknown method '" + str(method) + "'")
+
+def check_solver(solver):
+    """Raises ValueError if solver is not a name of a solver"""
+    if solver != 'backtracking' and solver not in solverBackends:
+        raise ValueError("Unknown solver '" + str(solver) + "'")
+
+class Batcher:
+    """Batcher collects concurrent requests with the same method and options and processes them in one worker call
+
+    A batch is sent to the executor when it has maxBatchSize requests or delay seconds after its first request.
+    """
+    def __init__(self, executor, maxBatchSize = 64, delay = 0.005):
+        """Initializes a Batcher object, it must be used from a running event loop
+
+        :param executor: Executor running batch functions, e.g. ProcessPoolExecutor
+        :type executor: concurrent.futures.Executor
+        :param maxBatchSize: Maximal number of requests in one batch
+        :type maxBatchSize: int
+        :param delay: Maximal time in seconds for which a request waits for other requests
+        :type delay: float
+        """
+        self.executor = executor
+        self.maxBatchSize = maxBatchSize
+        self.delay = delay
+
+        # Open batches { (method, options) : (items, futures, timer) }
+        self.batches = {}
+
+    async def submit(self, method, options, item):
+        """Adds an item to a batch and waits for its result
+
+        :return: result of the item, see batchFunctions
+        :type return: dict
+        """
+        loop = asyncio.get_running_loop()
+        key = (method, options)
+        batch = self.batches.get(key)
+        if batch is None:
+            batch = ([], [], loop.call_later(self.delay, self.flush, key))
+            self.batches[key] = batch
+        future = loop.create_future()
+        batch[0].append(item)
+        batch[1].append(future)
+        if len(batch[0]) >= self.maxBatchSize:
+            self.flush(key)
+        return await future
+
+    def flush(self, key):
+        """Sends the batch to the executor and sets results of its futures when it is processed"""
+        batch = self.batches.pop(key, None)
+        if batch is None:
+            return
+        items, futures, timer = batch
+        timer.cancel()
+        method, options = key
+        try:
+            task = asyncio.get_running_loop().run_in_executor(self.executor, batchFunctions[method], options, items)
+        except Exception as error: # e.g. BrokenProcessPool, flush() may run as a timer callback, so futures get the error
+            for future in futures:
+                if not future.cancelled():
+                    future.set_exception(error)
+            return
+
+        def distribute(task):
+            """Sets result or exception of every future of the batch"""
+            for index, future in enumerate(futures):
+                if future.cancelled():
+                    continue
+                if task.exception() is not None:
+                    future.set_exception(task.exception())
+                else:
+                    future.set_result(task.result()[index])
+        task.add_done_callback(distribute)
+
+class SudokuServer:
+    """SudokuServer serves generate, solve, validate and hint requests on a TCP socket, see the protocol above"""
+    def __init__(self, host = '127.0.0.1', port = 8765, workers = None, maxBatchSize = 64, batchDelay = 0.005):
+        """Initializes a SudokuServer object, the server is started by start()
+
+        :param host: Address to listen on
+        :type host: str
+        :param port: Port to listen on, 0 for any free port
+        :type port: int
+        :param workers: Number of worker processes, None for number of CPUs
+        :type workers: int
+        :param maxBatchSize: Maximal number of requests processed by a worker at once
+        :type maxBatchSize: int
+        :param batchDelay: Maximal time in seconds for which a request waits for other requests to be batched with
+        :type batchDelay: float
+        """
+        self.host = host
+        self.port = port
+        self.workers = workers or cpu_count()
+        self.maxBatchSize = maxBatchSize
+        self.batchDelay = batchDelay
+        self.executor = None
+        self.server = None
+
+    async def start(self):
+        """Starts worker processes and listening, port is set to the actual port"""
+        self.executor = ProcessPoolExecutor(self.workers, initializer = seed_worker)
+        self.batcher = Batcher(self.executor, self.maxBatchSize, self.batchDelay)
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        """Starts the server, if it is not started yet, and serves until it is cancelled"""
+        if self.server is None:
+            await self.start()
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self):
+        """Stops listening and worker processes"""
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures = True)
+            self.executor = None
+
+    async def handle_connection(self, reader, writer):
+        """Reads requests of a connection and answers each of them when it is processed"""
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    task = asyncio.create_task(self.answer(line, writer))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.wait(tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def answer(self, line, writer):
+        """Processes one request and writes its response"""
+        requestId = None
+        try:
+            request = json.loads(line)
+            if isinstance(request, dict):
+                requestId = request.get('id')
+            method, options, item = parse_request(request)
+            response = await self.batcher.submit(method, options, item)
+        except (ValueError, TypeError) as error: # json.JSONDecodeError is ValueError
+            response = {'error': str(error)}
+        except Exception as error: # e.g. BrokenProcessPool, the client waits for a response to every request
+            response = {'error': type(error).__name__ + ": " + str(error)}
+        response = dict(response, id = requestId)
+        writer.write(json.dumps(response).encode() + b'\n')
+        await writer.drain()
+
+async def query(requests, host = '127.0.0.1', port = 8765):
+    """Sends requests to a running server and waits for all their responses
+
+    :param requests: list of requests, "id" is set to their index when it is missing
+    :type requests: list of dict
+    :return: list of responses in the order of requests
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        requests = [dict({'id': index}, **request) for index, request in enumerate(requests)]
+        writer.write(b''.join(json.dumps(request).encode() + b'\n' for request in requests))
+        await writer.drain()
+        responses = {}
+        while len(responses) < len(requests):
+            line = await reader.readline()
+            if not line:
+                raise ConnectionError("Server closed the connection")
+            response = json.loads(line)
+            responses[response['id']] = response
+        return [responses[request['id']] for request in requests]
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+def main(arguments = None):
+    """Runs the server until it is interrupted
+
+    :param arguments: Command line arguments, None for sys.argv
+    :type arguments: list of str
+    """
+    parser = ArgumentParser(description = "Serves generating, solving, validating and hints of Sudoku puzzles")
+    parser.add_argument('--host', default = '127.0.0.1', help = "address to listen on")
+    parser.add_argument('--port', type = int, default = 8765, help = "port to listen on")
+    parser.add_argument('--workers', type = int, default = None, help = "number of worker processes")
+    parser.add_argument('--batch-size', type = int, default = 64, help = "maximal number of requests processed by a worker at once")
+    parser.add_argument('--batch-delay', type = float, default = 0.005, help = "seconds for which a request waits to be batched with others")
+    arguments = parser.parse_args(arguments)
+
+    server = SudokuServer(arguments.host, arguments.port, arguments.workers, arguments.batch_size, arguments.batch_delay)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
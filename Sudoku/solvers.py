@@ -0,0 +1,226 @@
+from time import perf_counter
+
+from dlx import DLXSolver
+from units import SolveLimitReached, get_tables
+
+class PropagationSolver:
+    """Solver that fills in naked and hidden singles and guesses in the most constrained cell"""
+    name = 'propagation'
+
+    def __init__(self, boxSize = 3):
+        """Initializes a PropagationSolver object
+
+        :param boxSize: Number of rows and columns of a box of solved grids, 3 for 9x9 grids
+        :type boxSize: int
+        """
+        self.tables = get_tables(boxSize)
+        self.stepLimit = -1 # -1 for no limit, see solve()
+        self.deadline = None
+
+    def solve(self, grid, maxSteps = None, deadline = None):
+        """Finds a solution of the given Sudoku grid
+
+        :param grid: Sudoku grid, 0 for empty cell, it is not changed
+        :type grid: list of lists of int
+        :param maxSteps: Maximal number of steps after which solving is stopped, None for no limit
+        :type maxSteps: int
+        :param deadline: perf_counter() time after which solving is stopped, None for no limit
+        :type deadline: float
+        :return: tuple (solved grid or None when solution does not exist, number of steps, number of guesses)
+        :raises SolveLimitReached: when a limit is reached
+        """
+        self.steps = 0
+        self.guesses = 0
+        self.stepLimit = -1 if maxSteps is None else maxSteps
+        self.deadline = deadline
+        state = self.create_state(grid)
+        solution = None if state is None else self.search(*state)
+        if solution is None:
+            return (None, self.steps, self.guesses)
+        size = self.tables.size
+        return ([solution[size*i:size*i + size] for i in range(size)], self.steps, self.guesses)
+
+    def count_solutions(self, grid, limit = None):
+        """Counts solutions of the given Sudoku grid
+
+        :param grid: Sudoku grid, 0 for empty cell, it is not changed
+        :type grid: list of lists of int
+        :param limit: Counting stops when limit solutions are found, None for no limit
+        :type limit: int
+        :return: number of solutions, at most limit
+        """
+        self.steps = 0
+        self.guesses = 0
+        self.stepLimit = -1
+        self.deadline = None
+        state = self.create_state(grid)
+        if state is None:
+            return 0
+        return self.count(*state, limit)
+
+    def create_state(self, grid):
+        """Creates flat list of values and bitmasks of used numbers in rows, columns and boxes
+
+        :param grid: Sudoku grid, 0 for empty cell
+        :type grid: list of lists of int
+        :return: tuple (values, rows, columns, boxes) or None if the grid contains duplicit values
+        """
+        tables = self.tables
+        cellRow, cellColumn, cellBox = tables.cellRow, tables.cellColumn, tables.cellBox
+        values = [value for row in grid for value in row]
+        rows = [0] * tables.size
+        columns = [0] * tables.size
+        boxes = [0] * tables.size
+        for cell in range(tables.cellCount):
+            if values[cell]:
+                bit = 1 << (values[cell] - 1)
+                i, j, b = cellRow[cell], cellColumn[cell], cellBox[cell]
+                if (rows[i] | columns[j] | boxes[b]) & bit:
+                    return None
+                rows[i] |= bit
+                columns[j] |= bit
+                boxes[b] |= bit
+        return (values, rows, columns, boxes)
+
+    def propagate(self, values, rows, columns, boxes):
+        """Fills in all naked and hidden singles until there is none left
+
+        :return: tuple (False if a contradiction was found, most constrained empty cell or -1 if grid is full)
+        """
+        tables = self.tables
+        cellRow, cellColumn, cellBox, fullMask = tables.cellRow, tables.cellColumn, tables.cellBox, tables.fullMask
+        empties = [cell for cell in range(tables.cellCount) if not values[cell]]
+        while True:
+            # A step is a pass over all empty cells, so the deadline is checked on every 16th step
+            if self.steps == self.stepLimit or (self.deadline is not None and not self.steps & 15 and perf_counter() > self.deadline):
+                raise SolveLimitReached(self.steps, self.guesses)
+            self.steps += 1
+            progress = False
+            bestCell = -1
+            bestCount = tables.size + 1
+            stillEmpty = []
+
+            # Naked singles - cells with only one possible number
+            for cell in empties:
+                if values[cell]:
+                    continue
+                i, j, b = cellRow[cell], cellColumn[cell], cellBox[cell]
+                candidates = ~(rows[i] | columns[j] | boxes[b]) & fullMask
+                if not candidates:
+                    return (False, -1)
+                if candidates & (candidates - 1) == 0:
+                    values[cell] = candidates.bit_length()
+                    rows[i] |= candidates
+                    columns[j] |= candidates
+                    boxes[b] |= candidates
+                    progress = True
+                else:
+                    stillEmpty.append(cell)
+                    if not progress:
+                        count = candidates.bit_count()
+                        if count < bestCount:
+                            bestCount = count
+                            bestCell = cell
+            empties = stillEmpty
+            if progress:
+                continue
+            if not empties:
+                return (True, -1)
+
+            # Hidden singles - numbers with only one possible cell in a unit
+            for unit in tables.units:
+                once = 0
+                twice = 0
+                used = 0
+                for cell in unit:
+                    if values[cell]:
+                        used |= 1 << (values[cell] - 1)
+                    else:
+                        candidates = ~(rows[cellRow[cell]] | columns[cellColumn[cell]] | boxes[cellBox[cell]]) & fullMask
+                        twice |= once & candidates
+                        once |= candidates
+                if (once | used) != fullMask:
+                    return (False, -1) # some number cannot be placed in the unit
+                singles = once & ~twice & ~used
+                while singles:
+                    bit = singles & -singles
+                    singles ^= bit
+                    for cell in unit:
+                        if not values[cell]:
+                            i, j, b = cellRow[cell], cellColumn[cell], cellBox[cell]
+                            if bit & ~(rows[i] | columns[j] | boxes[b]):
+                                values[cell] = bit.bit_length()
+                                rows[i] |= bit
+                                columns[j] |= bit
+                                boxes[b] |= bit
+                                progress = True
+                                break
+                    else:
+                        return (False, -1) # the only possible cell was taken by other single
+            if not progress:
+                return (True, bestCell)
+
+    def search(self, values, rows, columns, boxes):
+        """Propagates singles and then tries every possible number of the most constrained cell
+
+        :return: flat list of values of the solution or None if solution does not exist
+        """
+        isValid, cell = self.propagate(values, rows, columns, boxes)
+        if not isValid:
+            return None
+        if cell == -1:
+            return values
+
+        tables = self.tables
+        i, j, b = tables.cellRow[cell], tables.cellColumn[cell], tables.cellBox[cell]
+        candidates = ~(rows[i] | columns[j] | boxes[b]) & tables.fullMask
+        while candidates:
+            bit = candidates & -candidates
+            candidates ^= bit
+            self.guesses += 1
+            newValues = values[:]
+            newValues[cell] = bit.bit_length()
+            newRows, newColumns, newBoxes = rows[:], columns[:], boxes[:]
+            newRows[i] |= bit
+            newColumns[j] |= bit
+            newBoxes[b] |= bit
+            solution = self.search(newValues, newRows, newColumns, newBoxes)
+            if solution is not None:
+                return solution
+        return None
+
+    def count(self, values, rows, columns, boxes, limit):
+        """Same as search(), but counts all solutions instead of returning the first one
+
+        :return: number of solutions, at most limit
+        """
+        isValid, cell = self.propagate(values, rows, columns, boxes)
+        if not isValid:
+            return 0
+        if cell == -1:
+            return 1
+
+        count = 0
+        tables = self.tables
+        i, j, b = tables.cellRow[cell], tables.cellColumn[cell], tables.cellBox[cell]
+        candidates = ~(rows[i] | columns[j] | boxes[b]) & tables.fullMask
+        while candidates and count != limit:
+            bit = candidates & -candidates
+            candidates ^= bit
+            self.guesses += 1
+            newValues = values[:]
+            newValues[cell] = bit.bit_length()
+            newRows, newColumns, newBoxes = rows[:], columns[:], boxes[:]
+            newRows[i] |= bit
+            newColumns[j] |= bit
+            newBoxes[b] |= bit
+            count += self.count(newValues, newRows, newColumns, newBoxes, None if limit is None else limit - count)
+        return count
+
+# Solver backends selectable by name in Sudoku class, 'backtracking' is built in Sudoku class itself
+# Every backend is created as backend(boxSize) and provides solve(grid, maxSteps, deadline) -> (solution, steps, guesses),
+# which raises SolveLimitReached when a limit is reached, and count_solutions(grid, limit)
+solverBackends = {
+    PropagationSolver.name: PropagationSolver,
+    DLXSolver.name: DLXSolver,
+}
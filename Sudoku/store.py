@@ -0,0 +1,202 @@
+# Compact on-disk storage of Sudoku puzzles
+#
+# File layout (little endian):
+# - header of headerSize bytes: magic, version, record size, number of records,
+#   offsets of the difficulty index and of the seed index and number of seeds
+# - fixed size records: puzzle and solution packed to 4 bits per cell (41 bytes each, solution is zeros when unknown),
+#   number of empty cells (1 byte) and seed (8 bytes, noSeed when unknown)
+# - difficulty index: 82 counts of records with 0-81 empty cells followed by record numbers grouped by the number of empty cells
+# - seed index: (seed, record number) pairs sorted by seed
+#
+# The reader memory-maps the file, so records are read only when they are accessed.
+import mmap
+import struct
+from array import array
+
+magic = b'SUDOKUDB'
+version = 1
+headerFormat = struct.Struct('<8sHHIQQQQ')
+headerSize = 64
+recordFormat = struct.Struct('<41s41sBQ')
+seedEntryFormat = struct.Struct('<QI')
+noSeed = 0xFFFFFFFFFFFFFFFF
+emptySolution = bytes(41)
+
+def pack_grid(puzzle):
+    """Packs a puzzle string of 81 digits to 41 bytes, two cells per byte"""
+    return bytes.fromhex(puzzle + '0')
+
+def unpack_grid(data):
+    """Unpacks 41 bytes created by pack_grid() to a puzzle string of 81 digits"""
+    return data.hex()[:81]
+
+class PuzzleStoreWriter:
+    """PuzzleStoreWriter writes puzzles to a new store file, indexes are written when it is closed"""
+    def __init__(self, path):
+        """Initializes a PuzzleStoreWriter object and creates the file
+
+        :param path: Path of the store file, existing file is overwritten
+        :type path: str
+        """
+        self.file = open(path, 'wb')
+        self.file.write(bytes(headerSize))
+        self.count = 0
+        self.difficulties = [array('I') for _ in range(82)] # record numbers for each number of empty cells
+        self.seeds = [] # (seed, record number) pairs
+
+    def add(self, puzzle, solution = None, seed = None):
+        """Appends a puzzle to the store
+
+        :param puzzle: String of 81 digits, '0' for empty cell, see sudoku.format_puzzle()
+        :type puzzle: str
+        :param solution: String of 81 digits or None when it is not known
+        :type solution: str
+        :param seed: Seed that generates the puzzle, non-negative integer lower than noSeed, None when it is not known
+        :type seed: int
+        :return: record number of the puzzle
+        """
+        if len(puzzle) != 81 or (solution is not None and len(solution) != 81):
+            raise ValueError("Puzzle and solution must have 81 cells")
+        emptyCells = puzzle.count('0')
+        self.file.write(recordFormat.pack(pack_grid(puzzle), emptySolution if solution is None else pack_grid(solution),
+                                          emptyCells, noSeed if seed is None else seed))
+        self.difficulties[emptyCells].append(self.count)
+        if seed is not None:
+            self.seeds.append((seed, self.count))
+        self.count += 1
+        return self.count - 1
+
+    def close(self):
+        """Writes indexes and the header and closes the file"""
+        indexOffset = self.file.tell()
+        self.file.write(array('I', [len(records) for records in self.difficulties]).tobytes())
+        for records in self.difficulties:
+            self.file.write(records.tobytes())
+
+        seedIndexOffset = self.file.tell()
+        self.seeds.sort()
+        for seed, record in self.seeds:
+            self.file.write(seedEntryFormat.pack(seed, record))
+
+        self.file.seek(0)
+        self.file.write(headerFormat.pack(magic, version, recordFormat.size, 0, self.count, indexOffset, seedIndexOffset, len(self.seeds)))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exceptionInfo):
+        self.close()
+
+class PuzzleStore:
+    """PuzzleStore reads puzzles from a memory-mapped store file"""
+    def __init__(self, path):
+        """Initializes a PuzzleStore object and maps the file to memory
+
+        :param path: Path of the store file created by PuzzleStoreWriter
+        :type path: str
+        """
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+        fileMagic, fileVersion, recordSize, _, self.count, self.indexOffset, self.seedIndexOffset, self.seedCount = headerFormat.unpack_from(self.map, 0)
+        if fileMagic != magic or fileVersion != version or recordSize != recordFormat.size:
+            self.close()
+            raise ValueError("'" + path + "' is not a puzzle store of version " + str(version))
+
+        # Offsets of record numbers of each number of empty cells in the difficulty index
+        counts = array('I')
+        counts.frombytes(self.map[self.indexOffset:self.indexOffset + 4 * 82])
+        self.difficultyOffsets = []
+        offset = self.indexOffset + 4 * 82
+        for count in counts:
+            self.difficultyOffsets.append((offset, count))
+            offset += 4 * count
+
+    def __len__(self):
+        return self.count
+
+    def read(self, index):
+        """Reads a record
+
+        :param index: Record number
+        :type index: int
+        :return: tuple (puzzle string, solution string or None, number of empty cells, seed or None)
+        """
+        if not 0 <= index < self.count:
+            raise IndexError("Record " + str(index) + " is out of range")
+        puzzle, solution, emptyCells, seed = recordFormat.unpack_from(self.map, headerSize + index * recordFormat.size)
+        return (unpack_grid(puzzle), None if solution == emptySolution else unpack_grid(solution),
+                emptyCells, None if seed == noSeed else seed)
+
+    def __getitem__(self, index):
+        """Returns puzzle string of the given record"""
+        if not 0 <= index < self.count:
+            raise IndexError("Record " + str(index) + " is out of range")
+        offset = headerSize + index * recordFormat.size
+        return unpack_grid(self.map[offset:offset + 41])
+
+    def puzzles(self):
+        """Yields all puzzle strings in the order they were written"""
+        for index in range(self.count):
+            yield self[index]
+
+    def with_empty_cells(self, numberOfEmptyCells):
+        """Returns record numbers of puzzles with the given number of empty cells
+
+        :return: array of record numbers
+        """
+        offset, count = self.difficultyOffsets[numberOfEmptyCells]
+        records = array('I')
+        records.frombytes(self.map[offset:offset + 4 * count])
+        return records
+
+    def sample(self, count, rng, numberOfEmptyCells = None):
+        """Yields random puzzle strings, only the sampled records are read
+
+        :param count: Number of puzzles
+        :type count: int
+        :param rng: Random generator
+        :type rng: random.Random
+        :param numberOfEmptyCells: Number of empty cells of sampled puzzles, None for any
+        :type numberOfEmptyCells: int
+        """
+        if numberOfEmptyCells is None:
+            for _ in range(count):
+                yield self[rng.randrange(self.count)]
+        else:
+            offset, available = self.difficultyOffsets[numberOfEmptyCells]
+            if not available:
+                return
+            for _ in range(count):
+                yield self[struct.unpack_from('<I', self.map, offset + 4 * rng.randrange(available))[0]]
+
+    def seed_entry(self, position):
+        """Returns (seed, record number) pair at the given position of the seed index"""
+        return seedEntryFormat.unpack_from(self.map, self.seedIndexOffset + position * seedEntryFormat.size)
+
+    def find_seed(self, seed):
+        """Finds record number of the puzzle generated from the given seed by binary search in the seed index
+
+        :return: record number or None if the seed is not stored
+        """
+        low, high = 0, self.seedCount
+        while low < high:
+            middle = (low + high) // 2
+            if self.seed_entry(middle)[0] < seed:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.seedCount and self.seed_entry(low)[0] == seed:
+            return self.seed_entry(low)[1]
+        return None
+
+    def close(self):
+        """Unmaps and closes the file"""
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exceptionInfo):
+        self.close()
@@ -1,59 +1,284 @@
-from random import randint, shuffle # Randint and shuffle are used for generating Sudoku grid
+import random # Is seeded in worker processes, derive.py uses it when no random generator is given
+import sys
+from argparse import ArgumentParser # Is used for command line interface
+from array import array # Is used for packing bitmasks of snapshots
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor # Is used for solving and generating in parallel
+from hashlib import sha256 # Is used for deriving seeds
+from itertools import islice
+from os import cpu_count
+from random import Random # Is used for generating Sudoku grid from a seed
+from time import perf_counter # Is used for solving time limit and instrumentation
+
+from solvers import solverBackends, PropagationSolver
+from derive import derive_puzzles
+from dlx import DLXSolver
+from rating import DifficultyRater, difficulties
+from store import PuzzleStore, PuzzleStoreWriter
+from units import SolveLimitReached, get_tables, symbols
+
+# Random generator used when no seed is given, unlike the random module it can be copied and pickled with Sudoku objects
+defaultRandom = Random()
 
 class Sudoku:
     """Sudoku class provides backend functionalities for generating and operating with sudoku grid"""
-    def __init__(self, numberOfCellsToLeaveEmpty):
+    # Attributes are kept in slots instead of a dict per object, so many Sudoku objects can be held in memory
+    __slots__ = ('numberOfCellsToLeaveEmpty', 'tables', 'boxSize', 'size', 'boxOfCell', 'solver', 'solverBackend', 'unique', 'random',
+                 'grid', 'prefilled', 'cellsToSolve', 'solvedCells', 'userCellsDropped', 'errorCells', 'cellsChangedByUser',
+                 'columns', 'rows', 'boxes', 'columnsCount', 'rowsCount', 'boxesCount', 'solution', 'stats',
+                 'candidates', 'changedCells', 'positionCounts', 'nakedSingles', 'hiddenSingles', 'undoStack', 'redoStack')
+
+    def __init__(self, numberOfCellsToLeaveEmpty, solver = 'backtracking', unique = False, puzzle = None, seed = None, boxSize = 3):
         """Initializes a Sudoku object
         
         :param numberOfCellsToLeaveEmpty: Determins how many cells should be left out empty when generating sudoku grid
         :type numberOfCellsToLeaveEmpty: int
+        :param solver: Name of solver used by solve_full() and generate(), 'backtracking' or one of solvers.solverBackends
+        :type solver: str
+        :param unique: True for generating only puzzles with a unique solution, then less cells can be left out empty
+        :type unique: bool
+        :param puzzle: Puzzle to use instead of generating one, see load_puzzle()
+        :type puzzle: list of lists of int or str
+        :param seed: Seed or random generator used for generating, the same seed generates the same puzzle.
+            None for the module level random generator
+        :type seed: int or str or random.Random
+        :param boxSize: Number of rows and columns of a box, 3 for the standard 9x9 grid, 4 for 16x16 grid
+        :type boxSize: int
         """
         self.numberOfCellsToLeaveEmpty = numberOfCellsToLeaveEmpty
+
+        # Lookup tables of the grid size, the grid has size rows, columns and boxes
+        self.tables = get_tables(boxSize)
+        self.boxSize = boxSize
+        self.size = self.tables.size
+        self.boxOfCell = self.tables.boxOfCell
+
+        if solver != 'backtracking' and solver not in solverBackends:
+            raise ValueError("Unknown solver '" + solver + "'")
+        self.solver = solver
+        self.solverBackend = None if solver == 'backtracking' else solverBackends[solver](boxSize)
+        self.unique = unique
+
+        # Random generator used for generating, random module provides the same methods as random.Random
+        if seed is None:
+            self.random = defaultRandom
+        elif isinstance(seed, Random):
+            self.random = seed
+        else:
+            self.random = Random(seed)
         
         self.cellsToSolve = [] # list of empty cells
         self.solvedCells = [] # List of already filled cells
+
+        # True when backtracking has emptied a cell filled by user, cells before it were searched with its number,
+        # so the search is not exhaustive and it has to start again before it reports that solution does not exist
+        self.userCellsDropped = False
         
         # Dict of error cells tuples { coordinations : reason), coordinations = (i, j)
-        # reason is tuple of bools (row, column, box) true for more then one duplicit number in the same part
+        # reason is tuple of bools (column, row, box) true for more then one duplicit number in the same part
+        # It contains exactly the cells that are not prefilled and whose number is duplicit, it is updated on every change
         self.errorCells = {}
         
         # Dict of cells changed by user { coordinations : True }, coordinations = (i, j)
         self.cellsChangedByUser = {}
 
-        self.generate()
+        # Bitmasks of used numbers for each column/row/box determining if a number can be used in them
+        # e.g. if columns[1] & (1 << 3) == 0 then number 4 is not used yet in the 2nd column
+        self.columns = [0] * self.size
+        self.rows = [0] * self.size
+        self.boxes = [0] * self.size
+
+        # Counts of uses of each number in each column/row/box used for detecting duplicit values
+        # e.g. columnsCount[size*1 + 3] says how many times number 4 is used in the 2nd column
+        self.columnsCount = [0] * (self.size * self.size)
+        self.rowsCount = [0] * (self.size * self.size)
+        self.boxesCount = [0] * (self.size * self.size)
+
+        # Filled grid the puzzle was generated from, for loaded puzzles it is found by the first hint() or None
+        self.solution = None
+
+        # Counters of solving, None when instrumentation is disabled, see enable_stats()
+        self.stats = None
+
+        # Candidates of cells maintained for hint(), None until the first hint, see init_candidates()
+        self.candidates = None
+        self.changedCells = set() # coordinations of cells changed since the last hint
+
+        # Edits made by set_cells_value_user() as tuples (coordinations, old value, new value), see undo() and redo()
+        self.undoStack = []
+        self.redoStack = []
+
+        if puzzle is None:
+            self.generate()
+        else:
+            self.grid = [[0] * self.size for _ in range(self.size)]
+            self.load_puzzle(puzzle)
+
+    def load_puzzle(self, puzzle):
+        """Replaces the Sudoku grid by the given puzzle
+
+        Existing grid and auxiliary data structures are reused, so loading many puzzles into one object does not allocate them again.
+        All non-zero cells of the puzzle are treated as prefilled.
+        :param puzzle: Sudoku grid or string of size^2 characters row by row, see parse_puzzle()
+        :type puzzle: list of lists of int or str
+        """
+        size = self.size
+        values = parse_puzzle(puzzle) if isinstance(puzzle, str) else [value for row in puzzle for value in row]
+        if len(values) != size * size:
+            raise ValueError("Puzzle has " + str(len(values)) + " cells instead of " + str(size * size))
+        # Larger number would be counted in the next row, column or box of the usage counts
+        if not all(0 <= value <= size for value in values):
+            raise ValueError("Numbers of puzzle must be between 0 and " + str(size))
+        for i in range(size):
+            self.grid[i][:] = values[size*i:size*i + size]
+
+        self.errorCells.clear()
+        self.cellsChangedByUser.clear()
+        self.solution = None
+        self.map_grid()
+        self.numberOfCellsToLeaveEmpty = len(self.cellsToSolve)
+
+    def snapshot(self):
+        """Saves the state of the grid, so it can be restored by restore(), e.g. before trying a move
+
+        Snapshot is an immutable copy of the grid and auxiliary data structures packed into bytes, so many of them can be kept.
+        Candidates of hints and history of edits are not saved.
+        :return: SudokuSnapshot object
+        """
+        return SudokuSnapshot(self)
+
+    def restore(self, snapshot):
+        """Restores the state saved by snapshot(), the grid and auxiliary data structures are changed in place
+
+        Candidates of hints are computed again by the next hint() and history of edits is cleared.
+        :param snapshot: Snapshot of this object or of another object with the same box size
+        :type snapshot: SudokuSnapshot
+        """
+        size = self.size
+        if snapshot.size != size:
+            raise ValueError("Snapshot of " + str(snapshot.size) + "x" + str(snapshot.size) + " grid cannot be restored to "
+                             + str(size) + "x" + str(size) + " grid")
+        values = snapshot.grid
+        for i in range(size):
+            self.grid[i][:] = values[size*i:size*i + size]
+        self.prefilled = snapshot.prefilled
+        cellType, maskType = SudokuSnapshot.array_types(size)
+        masks = SudokuSnapshot.unpack(maskType, snapshot.masks)
+        self.columns[:], self.rows[:], self.boxes[:] = masks[:size], masks[size:2*size], masks[2*size:]
+        counts, countsSize = snapshot.counts, size * size
+        self.columnsCount[:], self.rowsCount[:], self.boxesCount[:] = counts[:countsSize], counts[countsSize:2*countsSize], counts[2*countsSize:]
+        self.errorCells.clear()
+        self.errorCells.update(snapshot.errorCells)
+        self.cellsChangedByUser.clear()
+        self.cellsChangedByUser.update(dict.fromkeys([divmod(cell, size) for cell in SudokuSnapshot.unpack(cellType, snapshot.cellsChangedByUser)], True))
+        self.cellsToSolve = [[cell // size, cell % size, startingIndex] for cell, startingIndex in zip(SudokuSnapshot.unpack(cellType, snapshot.cellsToSolve), snapshot.startingIndexes)]
+        self.solvedCells = [divmod(cell, size) for cell in SudokuSnapshot.unpack(cellType, snapshot.solvedCells)] # cells are tuples, see solve_full()
+        self.userCellsDropped = snapshot.userCellsDropped
+        self.numberOfCellsToLeaveEmpty = snapshot.numberOfCellsToLeaveEmpty
+        self.solution = snapshot.solution
+        self.candidates = None
+        self.changedCells.clear()
+        self.undoStack.clear()
+        self.redoStack.clear()
+
+    def clone(self):
+        """Returns an independent copy of this object, which is much cheaper than creating a new object from the grid
+
+        Lookup tables, solver backend, random generator and the immutable prefilled cells and solution are shared,
+        the grid and auxiliary data structures are copied. Candidates of hints, history of edits and stats are not copied.
+        :return: Sudoku object
+        """
+        other = Sudoku.__new__(Sudoku)
+        other.numberOfCellsToLeaveEmpty = self.numberOfCellsToLeaveEmpty
+        other.tables = self.tables
+        other.boxSize = self.boxSize
+        other.size = self.size
+        other.boxOfCell = self.boxOfCell
+        other.solver = self.solver
+        other.solverBackend = self.solverBackend
+        other.unique = self.unique
+        other.random = self.random
+        other.grid = [row[:] for row in self.grid]
+        other.prefilled = self.prefilled
+        other.cellsToSolve = [cell[:] for cell in self.cellsToSolve]
+        other.solvedCells = self.solvedCells[:] # its cells are immutable tuples
+        other.userCellsDropped = self.userCellsDropped
+        other.errorCells = dict(self.errorCells)
+        other.cellsChangedByUser = dict(self.cellsChangedByUser)
+        other.columns = self.columns[:]
+        other.rows = self.rows[:]
+        other.boxes = self.boxes[:]
+        other.columnsCount = self.columnsCount[:]
+        other.rowsCount = self.rowsCount[:]
+        other.boxesCount = self.boxesCount[:]
+        other.solution = self.solution
+        other.stats = None
+        other.candidates = None
+        other.changedCells = set()
+        other.undoStack = []
+        other.redoStack = []
+        return other
 
     def generate(self) -> list:
         """Function to generate elements into the Sudoku grid. """
+        size = self.size
         # Creates a shuffled row
-        shuffledRow = [i for i in range(1,10)]
-        shuffle(shuffledRow)
+        shuffledRow = [i for i in range(1, size + 1)]
+        self.random.shuffle(shuffledRow)
 
         # Creates an empty Sudoku grid
-        grid = [[0 for _ in range(9)] for _ in range(9)]
+        grid = [[0 for _ in range(size)] for _ in range(size)]
 
-        # Places shuffled row into the lower 2 thirds of the grid
-        randIndex = randint(3, 8)
+        # Places shuffled row below the first band of the grid
+        randIndex = self.random.randint(self.boxSize, size - 1)
         grid[randIndex] = shuffledRow
 
         # Places shifted shuffledRow as row 0
-        shiftNPlaces = randint(1, 8)
-        for i in range(9):
-            grid[0][i] = shuffledRow[(i + shiftNPlaces) % 9]
+        shiftNPlaces = self.random.randint(1, size - 1)
+        for i in range(size):
+            grid[0][i] = shuffledRow[(i + shiftNPlaces) % size]
 
         # Fills the grid
         self.grid = grid
         self.map_grid()
-        while self.solve() == 1: pass
+        self.solve_full()
+        self.solution = [row[:] for row in self.grid]
 
         # Leaves numberOfCellsToLeaveEmpty cells empty
-        leftOutCells = {}
-        while len(leftOutCells) < self.numberOfCellsToLeaveEmpty:
-            cell = (randint(0, 8), randint(0, 8))
-            if cell not in leftOutCells: 
-                self.grid[cell[0]][cell[1]] = 0
-                leftOutCells[cell] = True
+        if self.unique:
+            self.leave_out_cells_uniquely()
+        else:
+            leftOutCells = {}
+            while len(leftOutCells) < self.numberOfCellsToLeaveEmpty:
+                cell = (self.random.randint(0, size - 1), self.random.randint(0, size - 1))
+                if cell not in leftOutCells: 
+                    self.grid[cell[0]][cell[1]] = 0
+                    leftOutCells[cell] = True
         self.map_grid()
 
+    def leave_out_cells_uniquely(self):
+        """Leaves cells of a filled grid empty one by one while the puzzle keeps a unique solution
+
+        Cells are tried in random order, a cell whose removal makes the solution ambiguous is filled back.
+        Counting of solutions stops at 2, so ambiguity is found without enumerating all solutions.
+        If it is not possible to leave out numberOfCellsToLeaveEmpty cells, it is lowered to the number of left out cells.
+        """
+        backend = self.counting_backend()
+        cells = [(i, j) for i in range(self.size) for j in range(self.size)]
+        self.random.shuffle(cells)
+
+        leftOut = 0
+        for i, j in cells:
+            if leftOut == self.numberOfCellsToLeaveEmpty:
+                break
+            value = self.grid[i][j]
+            self.grid[i][j] = 0
+            if backend.count_solutions(self.grid, 2) == 1:
+                leftOut += 1
+            else:
+                self.grid[i][j] = value
+        self.numberOfCellsToLeaveEmpty = leftOut
+
     def which_box(self, i, j):
         """Returns number of box that the given cell belongs
         param i: Cell's row
@@ -61,7 +286,7 @@ class Sudoku:
         param j: Cell's column
         type j: int
         """
-        return (3*(i // 3) + (j // 3))
+        return self.boxOfCell[i][j]
 
     def set_cell_as_empty(self, coordinations):
         """Sets value of a cell to 0 and changes auxiliary data structures accordingly
@@ -77,6 +302,8 @@ class Sudoku:
             return
 
         self.grid[i][j] = 0
+        if self.candidates is not None:
+            self.changedCells.add((i, j))
         
         # Removes pottential record in self.cellsChangedByUser
         if (i, j) in self.cellsChangedByUser:
@@ -86,10 +313,86 @@ class Sudoku:
         if (i, j) in self.errorCells:
             del self.errorCells[(i, j)]
 
-        self.columns[j][indexN].dec()
-        self.rows[i][indexN].dec()
-        self.boxes[self.which_box(i, j)][indexN].dec()
-       
+        boxIndex = self.boxOfCell[i][j]
+        self.release_number(i, j, boxIndex, indexN)
+
+        # If the number is still used in the row, column or box, it was duplicit and its other uses may be valid now
+        size = self.size
+        if self.rowsCount[size*i + indexN] or self.columnsCount[size*j + indexN] or self.boxesCount[size*boxIndex + indexN]:
+            self.update_error_cells(i, j, indexN + 1)
+
+    def update_error_cells(self, i, j, value):
+        """Rechecks the given cell and its peers with the given value and updates errorCells accordingly
+
+        Only cells sharing a row, column or box with the changed cell can change their validity,
+        so the number of checked cells does not depend on the number of error cells.
+        :param i: Changed cell's row
+        :type i: int
+        :param j: Changed cell's column
+        :type j: int
+        :param value: Number whose uses are rechecked
+        :type value: int
+        """
+        indexN = value - 1
+        grid = self.grid
+        size = self.size
+        for a, b in [(i, j)] + self.tables.peerCoordinations[i][j]:
+            if grid[a][b] != value or self.prefilled[a][b]:
+                continue
+            isColumnProblem = self.columnsCount[size*b + indexN] > 1
+            isRowProblem = self.rowsCount[size*a + indexN] > 1
+            isBoxProblem = self.boxesCount[size*self.boxOfCell[a][b] + indexN] > 1
+            if isColumnProblem or isRowProblem or isBoxProblem:
+                self.errorCells[(a, b)] = (isColumnProblem, isRowProblem, isBoxProblem)
+            elif (a, b) in self.errorCells:
+                del self.errorCells[(a, b)]
+
+    def use_number(self, i, j, boxIndex, indexN):
+        """Registers a new use of number indexN + 1 in the given row, column and box
+
+        :param i: Cell's row
+        :type i: int
+        :param j: Cell's column
+        :type j: int
+        :param boxIndex: Cell's box
+        :type boxIndex: int
+        :param indexN: Number - 1
+        :type indexN: int
+        """
+        bit = 1 << indexN
+        size = self.size
+        self.rowsCount[size*i + indexN] += 1
+        self.columnsCount[size*j + indexN] += 1
+        self.boxesCount[size*boxIndex + indexN] += 1
+        self.rows[i] |= bit
+        self.columns[j] |= bit
+        self.boxes[boxIndex] |= bit
+
+    def release_number(self, i, j, boxIndex, indexN):
+        """Removes one use of number indexN + 1 in the given row, column and box
+
+        Bit of the number is cleared only when there is no other use left in the same part.
+        :param i: Cell's row
+        :type i: int
+        :param j: Cell's column
+        :type j: int
+        :param boxIndex: Cell's box
+        :type boxIndex: int
+        :param indexN: Number - 1
+        :type indexN: int
+        """
+        bit = 1 << indexN
+        size = self.size
+        self.rowsCount[size*i + indexN] -= 1
+        if self.rowsCount[size*i + indexN] == 0:
+            self.rows[i] &= ~bit
+        self.columnsCount[size*j + indexN] -= 1
+        if self.columnsCount[size*j + indexN] == 0:
+            self.columns[j] &= ~bit
+        self.boxesCount[size*boxIndex + indexN] -= 1
+        if self.boxesCount[size*boxIndex + indexN] == 0:
+            self.boxes[boxIndex] &= ~bit
+
     def set_cells_value(self, coordinations, value):
         """Sets value of a cell and changes auxiliary data structures accordingly
 
@@ -112,20 +415,18 @@ class Sudoku:
 
         self.grid[i][j] = value
         indexN = value - 1
+        if self.candidates is not None:
+            self.changedCells.add((i, j))
 
         if value > 0:
-            box_index = self.which_box(i, j)
-            # Checks for duplicit values
-            isRowProblem = not self.rows[i][indexN] # todo: check if it works
-            isColumnProblem = not self.columns[j][indexN] 
-            isBoxProblem = not self.boxes[box_index][indexN]
+            boxIndex = self.boxOfCell[i][j]
+            bit = 1 << indexN
+            # Checks for duplicit values, which make this cell and its peers with the same value error cells
+            isDuplicit = ((self.rows[i] | self.columns[j] | self.boxes[boxIndex]) & bit) != 0
 
-            if isColumnProblem or isRowProblem or isBoxProblem:
-                self.errorCells[coordinations] = (isColumnProblem, isRowProblem, isBoxProblem)
-
-            self.columns[j][indexN].inc()
-            self.rows[i][indexN].inc()
-            self.boxes[box_index][indexN].inc()
+            self.use_number(i, j, boxIndex, indexN)
+            if isDuplicit:
+                self.update_error_cells(i, j, value)
                 
     def set_cells_value_user(self, coordinations, value):
         """Sets value of a cell, changes auxiliary data structures accordingly and register cell as changed by user
@@ -141,33 +442,51 @@ class Sudoku:
 
         if self.grid[i][j] == value: return # Nothing needs to be changed
 
-        originalValueIndex = self.grid[i][j] - 1
+        self.undoStack.append(((i, j), self.grid[i][j], value))
+        self.redoStack.clear()
+        self.change_value_user((i, j), value)
+
+    def change_value_user(self, coordinations, value):
+        """Sets value of a cell changed by user without recording it to the history of edits
 
+        :param coordinations: (cell's row, cell's column)
+        :type coordinations: (int, int)
+        :param value: New value of the cell, 0 for emptying it
+        :type value: int
+        """
+        # errorCells are updated incrementally by set_cells_value
         self.set_cells_value(coordinations, value)
-        self.cellsChangedByUser[coordinations] = True
-        
-        # Check each error cell if it is still still an error cell after a value is changed because it can make other cell valid
-        errorCells = list(self.errorCells.keys())
-
-        for errorCell in errorCells:
-            errrorI, errorJ = errorCell
-            if self.grid[errrorI][errorJ] == originalValueIndex and errorCell != coordinations:
-                if i == errrorI and not self.rows[i][originalValueIndex].is_used_repeatedly():
-                    problemsWithCell = self.errorCells[errorCell]
-                    self.errorCells[errorCell] = (False, problemsWithCell[1], problemsWithCell[2])
-
-                if j == errorJ and not self.columns[j][originalValueIndex].is_used_repeatedly():
-                    problemsWithCell = self.errorCells[errorCell]
-                    self.errorCells[errorCell] = (problemsWithCell[0], False, problemsWithCell[2])
-
-                boxNumber = self.which_box(errrorI, errorJ)
-                if self.which_box(i, j) == self.which_box(errrorI, errorJ) and not self.boxes[boxNumber][originalValueIndex].is_used_repeatedly():
-                    problemsWithCell = self.errorCells[errorCell]
-                    self.errorCells[errorCell] = (problemsWithCell[0], problemsWithCell[1], False)
-
-            if self.errorCells[errorCell] == (False, False, False):
-                del self.errorCells[errorCell]
-                        
+
+        # Emptied cell is no longer changed by user, set_cell_as_empty() has removed it
+        if value:
+            self.cellsChangedByUser[coordinations] = True
+
+    def undo(self):
+        """Takes back the last edit made by set_cells_value_user()
+
+        :return: coordinations of the changed cell or None when there is no edit to take back
+        """
+        if not self.undoStack:
+            return None
+        edit = self.undoStack.pop()
+        coordinations, oldValue, _ = edit
+        self.change_value_user(coordinations, oldValue)
+        self.redoStack.append(edit)
+        return coordinations
+
+    def redo(self):
+        """Makes again the last edit taken back by undo()
+
+        :return: coordinations of the changed cell or None when there is no edit to make again
+        """
+        if not self.redoStack:
+            return None
+        edit = self.redoStack.pop()
+        coordinations, _, newValue = edit
+        self.change_value_user(coordinations, newValue)
+        self.undoStack.append(edit)
+        return coordinations
+
     def find_possible_n(self, i, j, startIndex = 0):
         """Finds first possible number to put in the given cell
         
@@ -179,43 +498,62 @@ class Sudoku:
         :type j: int
         :return: Returns tuple (bool if possible number exists, int possible number)
         """
-        indexOfBox = self.which_box(i, j)
-        wasFound = False
-        number = 0
-        for x in range(startIndex, 9): #maybe n of step is needed
-            if (self.columns[j][x] and
-                self.rows[i][x] and
-                self.boxes[indexOfBox][x]):
-                    number = x + 1
-                    wasFound = True
-                    break
-        return (wasFound, number)
+        if self.stats is not None:
+            self.stats.probes += 1
+        # Bits of numbers that are not used in the cell's row, column and box and are not lower than startIndex + 1
+        free = ~(self.rows[i] | self.columns[j] | self.boxes[self.boxOfCell[i][j]]) & (self.tables.fullMask >> startIndex << startIndex)
+        if free:
+            # The lowest set bit x stands for number x + 1, which is its bit length
+            return (True, (free & -free).bit_length())
+        return (False, 0)
     
     def map_grid(self):
         """Finds all empty cells that needs to be filled and puts information to auxiliary data structures - rows, columns, boxes"""
         self.cellsToSolve = []
         self.solvedCells = []
+        self.userCellsDropped = False
+
+        # Cells that are filled when the grid is mapped cannot be error cells
+        # Rows are bytes with 1 for prefilled cell, they take less memory than lists and are shared by clones and snapshots
+        self.prefilled = [bytes(value != 0 for value in row) for row in self.grid]
+
+        # Candidates and history of edits belong to the previous grid
+        self.candidates = None
+        self.changedCells.clear()
+        self.undoStack.clear()
+        self.redoStack.clear()
 
-        # List of lists of UsageCounter objects for each column/row/box determiting if a number can be used in them
-        # e.g. if columns[1][3] == true then number 3 is not used yet in the 2nd column
-        self.columns = [[UsageCounter() for _ in range(9)] for _ in range(9)]
-        self.rows = [[UsageCounter() for _ in range(9)] for _ in range(9)]
-        self.boxes = [[UsageCounter() for _ in range(9)] for _ in range(9)]
+        # Resets auxiliary data structures in place
+        emptyMasks, emptyCounts = self.tables.emptyMasks, self.tables.emptyCounts
+        self.columns[:] = emptyMasks
+        self.rows[:] = emptyMasks
+        self.boxes[:] = emptyMasks
+        self.columnsCount[:] = emptyCounts
+        self.rowsCount[:] = emptyCounts
+        self.boxesCount[:] = emptyCounts
 
-        for i in range(9):
-            for j in range(9):
+        boxOfCell = self.boxOfCell
+        for i in range(self.size):
+            for j in range(self.size):
                 if self.grid[i][j] != 0:
-                    if self.columns[j][self.grid[i][j] - 1] == False:
-                        pass
-                    self.columns[j][self.grid[i][j] - 1].inc()
-                    if self.rows[i][self.grid[i][j] - 1] == False:
-                        pass
-                    self.rows[i][self.grid[i][j] - 1].inc()
-                    if self.boxes[self.which_box(i, j)][self.grid[i][j] - 1] == False:
-                        pass
-                    self.boxes[self.which_box(i, j)][self.grid[i][j] - 1].inc()
+                    self.use_number(i, j, boxOfCell[i][j], self.grid[i][j] - 1)
                 else: self.cellsToSolve.append([i, j, 0])    #[row n, column n, starting index]
     
+    def find_conflicts(self):
+        """Finds all cells including prefilled ones whose number repeats in their row, column or box
+
+        :return: list of coordinations (i, j)
+        """
+        conflicts = []
+        size = self.size
+        for i in range(size):
+            for j in range(size):
+                indexN = self.grid[i][j] - 1
+                if indexN >= 0 and (self.rowsCount[size*i + indexN] > 1 or self.columnsCount[size*j + indexN] > 1
+                                    or self.boxesCount[size*self.boxOfCell[i][j] + indexN] > 1):
+                    conflicts.append((i, j))
+        return conflicts
+
     def is_win(self):
         """Checks if the sudoku is solved"""
         if (self.numberOfCellsToLeaveEmpty <= len(self.cellsChangedByUser) and len(self.errorCells) == 0):
@@ -228,10 +566,16 @@ class Sudoku:
         The method works only if cells in grid are all valid
         :return: 0 if solved, 1 when there are empty cells left in sudoku grid, 2 when solution does not exist.
         """
+        stats = self.stats
+        if stats is not None:
+            start = perf_counter()
+
         # First set any invalid cell to empty
         if len(self.errorCells) > 0:
             cell = self.errorCells.popitem()[0]
             self.set_cell_as_empty(cell)
+            if stats is not None:
+                stats.record('clear_errors', start, cell)
             return 1
             
         # Fills what needs to be filled
@@ -245,66 +589,965 @@ class Sudoku:
                 # If there is already a valid number, try to leave it
                 if self.grid[i][j] != 0:
                     self.solvedCells.append((i, j))
+                    if stats is not None:
+                        stats.record('forward', start, (i, j), len(self.solvedCells))
                     
                 # If possible number was found
                 elif possibleN[0]: 
                     self.cellsToSolve[len(self.solvedCells)][2] = possibleN[1] # Set startingindex to go though only not visited states
                     self.set_cells_value((i, j), possibleN[1])
                     self.solvedCells.append((i, j))
+                    if stats is not None:
+                        stats.placements += 1
+                        stats.record('forward', start, (i, j), len(self.solvedCells))
 
                 # If there are solved cells that we can restore to be empty
                 elif len(self.solvedCells) > 0: 
                     self.cellsToSolve[len(self.solvedCells)][2] = 0
                     toRestore = self.solvedCells.pop()
+                    if toRestore in self.cellsChangedByUser:
+                        self.userCellsDropped = True
                     self.set_cell_as_empty(toRestore)
+                    if stats is not None:
+                        stats.backtracks += 1
+                        stats.record('backtrack', start, toRestore)
                     
                 else:
-                    # If there are no computer solved cells to revert, empty cells added by user
+                    # The search without any cell filled by user was exhaustive
+                    isExhaustive = not self.cellsChangedByUser and not self.userCellsDropped
+
+                    # If there are no computer solved cells to revert, empty cells added by user and start again
                     if len(self.cellsChangedByUser) > 0:
                         for i in range(len(self.cellsToSolve)):
                             self.set_cell_as_empty(self.cellsToSolve[i][:2])
-                        self.cellsToSolve[0][2] = 0
-                    else: 
-                        self.cellsToSolve[0][2] = 0
-                        # return 2 # no possible solution
+                    self.cellsToSolve[0][2] = 0
+                    self.userCellsDropped = False
+                    if stats is not None:
+                        stats.record('backtrack', start, tuple(self.cellsToSolve[0][:2]))
+                    if isExhaustive:
+                        return 2 # no possible solution
                         
                 return 1 # some cells might be still empty     
             
         return 0 # all cells filled
 
-class UsageCounter:
-    """Counter, that counts, how many times something is used."""
-    count : int
-    def __init__(self):
-        self.count = 0
-    
-    def __bool__(self):
-        """True for is not used"""
-        return self.count == 0
-
-    def inc(self):
-        """New use"""
-        self.count += 1
-
-    def dec(self):
-        """Increase count of uses"""
-        self.count -= 1
-        if self.count < 0: # todo: for testing
-            pass
-
-    def is_used_repeatedly(self):
-        """Provides information, if a given thing is used repeatedly
-        
-        :return: bool if count is greater then 1
+    def solve_full(self, maxSteps = None, timeout = None):
+        """Fills in all empty spaces in Sudoku grid at once
+
+        Runs the same backtracking as repeated calls of solve() do, but in one loop without the call overhead.
+        Every iteration of the loop corresponds to one call of solve(). When a solver backend is used (see is_resumable()),
+        the grid is left unchanged when a limit is reached and the next call starts solving again.
+        :param maxSteps: Maximal number of steps after which solving is stopped, None for no limit
+        :type maxSteps: int
+        :param timeout: Maximal solving time in seconds after which solving is stopped, None for no limit
+        :type timeout: float
+        :return: SolveResult with status 0 if solved, 1 when the limit was reached, 2 when solution does not exist
+        :type return: SolveResult
         """
-        return self.count > 1
-    
-def main():
-    """Prints generated Sudoku grid """
-    sudoku = Sudoku(20)
-    for row in sudoku.grid:
-        print(*row)
-    print()
+        if not self.is_resumable():
+            return self.solve_with_backend(self.counting_backend(), maxSteps, timeout)
+
+        # The loop below changes grid and bitmasks directly without noting changed cells, so candidates of hints are computed again
+        self.candidates = None
+
+        steps = 0
+        backtracks = 0
+        stepLimit = -1 if maxSteps is None else maxSteps
+        deadline = None if timeout is None else perf_counter() + timeout
+        # Instrumentation costs one comparison per step when it is disabled
+        stats = self.stats
+
+        # First set all invalid cells to empty
+        while self.errorCells:
+            if steps == stepLimit:
+                return SolveResult(1, self.grid, steps, backtracks)
+            steps += 1
+            if stats is not None:
+                start = perf_counter()
+            cell = self.errorCells.popitem()[0]
+            self.set_cell_as_empty(cell)
+            if stats is not None:
+                stats.record('clear_errors', start, cell)
+
+        grid = self.grid
+        rows, columns, boxes = self.rows, self.columns, self.boxes
+        rowsCount, columnsCount, boxesCount = self.rowsCount, self.columnsCount, self.boxesCount
+        cellsToSolve = self.cellsToSolve
+        solvedCells = self.solvedCells
+        cellsChangedByUser = self.cellsChangedByUser
+        boxOfCell = self.boxOfCell
+        fullMask = self.tables.fullMask
+        size = self.size
+        toSolveCount = len(cellsToSolve)
+        solvedCount = len(solvedCells)
+
+        while solvedCount < toSolveCount:
+            if steps == stepLimit or (deadline is not None and not steps & 1023 and perf_counter() > deadline):
+                return SolveResult(1, grid, steps, backtracks)
+            steps += 1
+            if stats is not None:
+                start = perf_counter()
+
+            cell = cellsToSolve[solvedCount]
+            i, j, startingIndex = cell
+
+            # If there is already a valid number, try to leave it
+            if grid[i][j] != 0:
+                solvedCells.append((i, j))
+                solvedCount += 1
+                if stats is not None:
+                    stats.record('forward', start, (i, j), solvedCount)
+                continue
+
+            boxIndex = boxOfCell[i][j]
+            free = ~(rows[i] | columns[j] | boxes[boxIndex]) & (fullMask >> startingIndex << startingIndex)
+
+            # If possible number was found
+            if free:
+                bit = free & -free
+                indexN = bit.bit_length() - 1
+                cell[2] = indexN + 1 # Set startingindex to go though only not visited states
+                grid[i][j] = indexN + 1
+                rowsCount[size*i + indexN] += 1
+                columnsCount[size*j + indexN] += 1
+                boxesCount[size*boxIndex + indexN] += 1
+                rows[i] |= bit
+                columns[j] |= bit
+                boxes[boxIndex] |= bit
+                solvedCells.append((i, j))
+                solvedCount += 1
+                if stats is not None:
+                    stats.probes += 1
+                    stats.placements += 1
+                    stats.record('forward', start, (i, j), solvedCount)
+
+            # If there are solved cells that we can restore to be empty
+            elif solvedCount > 0:
+                cell[2] = 0
+                backtracks += 1
+                toRestore = solvedCells.pop()
+                solvedCount -= 1
+                i, j = toRestore
+                indexN = grid[i][j] - 1
+                grid[i][j] = 0
+                if toRestore in cellsChangedByUser:
+                    del cellsChangedByUser[toRestore]
+                    self.userCellsDropped = True
+                self.release_number(i, j, boxOfCell[i][j], indexN)
+                if stats is not None:
+                    stats.probes += 1
+                    stats.backtracks += 1
+                    stats.record('backtrack', start, toRestore)
+
+            # If there are no computer solved cells to revert, empty cells added by user and start again
+            elif cellsChangedByUser or self.userCellsDropped:
+                for k in range(toSolveCount):
+                    self.set_cell_as_empty(cellsToSolve[k][:2])
+                cell[2] = 0
+                self.userCellsDropped = False
+                if stats is not None:
+                    stats.probes += 1
+                    stats.record('backtrack', start, (i, j))
+
+            else:
+                cell[2] = 0
+                if stats is not None:
+                    stats.probes += 1
+                    stats.record('backtrack', start, (i, j))
+                return SolveResult(2, grid, steps, backtracks) # no possible solution
+
+        return SolveResult(0, grid, steps, backtracks) # all cells filled
+
+    def solve_with_backend(self, backend, maxSteps = None, timeout = None):
+        """Fills in all empty spaces in Sudoku grid using a solver backend
+
+        Same as in solve(), invalid cells are emptied first and cells filled by user are kept if it is possible.
+        :param backend: Solver backend, e.g. one of solvers.solverBackends
+        :param maxSteps: Maximal number of steps after which solving is stopped, None for no limit
+        :type maxSteps: int
+        :param timeout: Maximal solving time in seconds after which solving is stopped, None for no limit
+        :type timeout: float
+        :return: SolveResult with status 0 if solved, 1 when the limit was reached, 2 when solution does not exist
+        :type return: SolveResult
+        """
+        deadline = None if timeout is None else perf_counter() + timeout
+        steps = len(self.errorCells)
+        guesses = 0
+        if self.stats is not None:
+            start = perf_counter()
+        while self.errorCells:
+            self.set_cell_as_empty(self.errorCells.popitem()[0])
+        if self.stats is not None:
+            self.stats.add_time('clear_errors', start)
+            start = perf_counter()
+
+        isLimitReached = False
+        try:
+            solution, backendSteps, backendGuesses = backend.solve(self.grid, self.steps_left(maxSteps, steps), deadline)
+            steps += backendSteps
+            guesses += backendGuesses
+
+            # Cells filled by previous solve() calls may be wrong guesses, so they are emptied and only cells filled by user are kept
+            guessedCells = [(i, j) for i, j, _ in self.cellsToSolve if self.grid[i][j] and (i, j) not in self.cellsChangedByUser]
+            if solution is None and guessedCells:
+                for cell in guessedCells:
+                    self.set_cell_as_empty(cell)
+                solution, backendSteps, backendGuesses = backend.solve(self.grid, self.steps_left(maxSteps, steps), deadline)
+                steps += backendSteps
+                guesses += backendGuesses
+
+            # If there is no solution with cells filled by user, try it without them
+            if solution is None and self.cellsChangedByUser:
+                for cell in self.cellsToSolve:
+                    self.set_cell_as_empty(cell[:2])
+                solution, backendSteps, backendGuesses = backend.solve(self.grid, self.steps_left(maxSteps, steps), deadline)
+                steps += backendSteps
+                guesses += backendGuesses
+        except SolveLimitReached as limit:
+            solution = None
+            steps += limit.steps
+            guesses += limit.guesses
+            isLimitReached = True
+
+        # Backends are not instrumented step by step, their whole run is counted as forward filling
+        if self.stats is not None:
+            self.stats.steps += steps
+            self.stats.add_time('forward', start)
+
+        if isLimitReached:
+            return SolveResult(1, self.grid, steps, 0, guesses)
+        if solution is None:
+            return SolveResult(2, self.grid, steps, 0, guesses) # no possible solution
+
+        for i, j, _ in self.cellsToSolve:
+            self.set_cells_value((i, j), solution[i][j])
+        self.solvedCells = [(i, j) for i, j, _ in self.cellsToSolve]
+        return SolveResult(0, self.grid, steps, 0, guesses)
+
+    @staticmethod
+    def steps_left(maxSteps, steps):
+        """Returns number of steps left of maxSteps after steps were done, None for no limit"""
+        return None if maxSteps is None else max(maxSteps - steps, 0)
+
+    def is_resumable(self):
+        """Checks if solve_full() continues where its previous call stopped
+
+        Only the backtracking of this class can be resumed, it is practical only up to 9x9 grids, so larger grids
+        are solved by a solver backend, which starts again on every call.
+        """
+        return self.solver == 'backtracking' and self.size <= 9
+
+    def enable_stats(self, callback = None):
+        """Enables instrumentation of solving, counters are collected in stats from now on
+
+        :param callback: Function called after every solving step as callback(phase, cell, stats), see SolveStats.record()
+        :return: new SolveStats object
+        """
+        self.stats = SolveStats(callback)
+        return self.stats
+
+    def disable_stats(self):
+        """Disables instrumentation of solving
+
+        :return: collected SolveStats object or None if instrumentation was not enabled
+        """
+        stats = self.stats
+        self.stats = None
+        return stats
+
+    def counting_backend(self):
+        """Returns solver backend used for counting solutions
+
+        Backtracking cannot count solutions, so PropagationSolver is used when it is the selected solver.
+        It is also used by solve_full() for grids larger than 9x9.
+        """
+        return self.solverBackend if self.solverBackend is not None else PropagationSolver(self.boxSize)
+
+    def count_solutions(self, limit = None):
+        """Counts solutions of the current Sudoku grid
+
+        :param limit: Counting stops when limit solutions are found, None for no limit
+        :type limit: int
+        :return: number of solutions, at most limit
+        """
+        return self.counting_backend().count_solutions(self.grid, limit)
+
+    def iterate_solutions(self, limit = None, countOnly = False):
+        """Yields distinct solutions of the current Sudoku grid one by one, the next one is searched only when it is requested
+
+        Solutions are enumerated by the iterative search of a DLXSolver of its own, which keeps only the current partial
+        solution, so grids with a huge number of solutions are enumerated in constant memory and other solving of this
+        object does not disturb the enumeration. The grid is read when the first solution is requested.
+        :param limit: Enumeration stops after limit solutions, None for enumerating all of them
+        :type limit: int
+        :param countOnly: True for yielding number of solutions found so far instead of solved grids, which are then not built
+        :type countOnly: bool
+        :return: generator of solved grids (lists of lists of int) or of ints
+        """
+        size = self.size
+        count = 0
+        if limit == 0:
+            return
+        for values in DLXSolver(self.boxSize).iterate_solutions(self.grid, countOnly):
+            count += 1
+            yield count if countOnly else [values[size*i:size*i + size] for i in range(size)]
+            if count == limit:
+                return
+
+    def rate(self):
+        """Rates difficulty of the current Sudoku grid by the solving techniques it needs, see rating.DifficultyRater
+
+        :return: rating.Rating object
+        """
+        return DifficultyRater(self.boxSize).rate(self.grid)
+
+    def init_candidates(self):
+        """Computes candidates of all cells for hint(), later they are updated only for changed cells and their peers
+
+        candidates[cell] is bitmask of numbers not used in the row, column and box of an empty cell, 0 for filled cell.
+        positionCounts[size*unit + indexN] is number of cells of a unit (index to tables.units) with candidate indexN + 1.
+        nakedSingles are cells with one candidate and hiddenSingles are keys of positionCounts equal to 1.
+        """
+        tables = self.tables
+        self.candidates = [0] * tables.cellCount
+        self.positionCounts = [0] * (3 * self.size * self.size)
+        self.nakedSingles = set()
+        self.hiddenSingles = set()
+        self.changedCells.clear()
+        for cell in range(tables.cellCount):
+            self.update_candidates(cell)
+
+    def update_candidates(self, cell):
+        """Recomputes candidates of a cell given by flat index and updates singles by the changed candidates"""
+        tables = self.tables
+        size = self.size
+        i, j, boxIndex = tables.cellRow[cell], tables.cellColumn[cell], tables.cellBox[cell]
+        new = 0 if self.grid[i][j] else ~(self.rows[i] | self.columns[j] | self.boxes[boxIndex]) & tables.fullMask
+        old = self.candidates[cell]
+        if new == old:
+            return
+        self.candidates[cell] = new
+        if new and new & (new - 1) == 0:
+            self.nakedSingles.add(cell)
+        else:
+            self.nakedSingles.discard(cell)
+
+        positionCounts, hiddenSingles = self.positionCounts, self.hiddenSingles
+        changed = old ^ new
+        while changed:
+            bit = changed & -changed
+            changed ^= bit
+            indexN = bit.bit_length() - 1
+            delta = 1 if new & bit else -1
+            for unit in (i, size + j, 2*size + boxIndex):
+                key = size*unit + indexN
+                positionCounts[key] += delta
+                if positionCounts[key] == 1:
+                    hiddenSingles.add(key)
+                else:
+                    hiddenSingles.discard(key)
+
+    def find_solution(self):
+        """Returns solution of the puzzle, i.e. of its prefilled cells, it is found only once
+
+        :return: solved grid or None when solution does not exist
+        """
+        if self.solution is None:
+            puzzle = [[value if isPrefilled else 0 for value, isPrefilled in zip(row, prefilledRow)]
+                      for row, prefilledRow in zip(self.grid, self.prefilled)]
+            self.solution = self.counting_backend().solve(puzzle)[0]
+        return self.solution
+
+    def find_mistake(self):
+        """Returns hint correcting a cell whose number differs from the solution or None
+
+        Cells changed by user are checked first, then other cells that are not prefilled, which may be filled in
+        by a solve_full() stopped before the end.
+        """
+        solution = self.find_solution()
+        if solution is not None:
+            grid = self.grid
+            for i, j in self.cellsChangedByUser:
+                if grid[i][j] != solution[i][j]:
+                    return Hint((i, j), solution[i][j], 'mistake')
+            for i in range(self.size):
+                for j in range(self.size):
+                    if grid[i][j] and not self.prefilled[i][j] and grid[i][j] != solution[i][j]:
+                        return Hint((i, j), solution[i][j], 'mistake')
+        return None
+
+    def hint(self):
+        """Finds the next move of the player
+
+        Candidates are updated only for cells changed since the last hint and their peers, so a hint does not re-solve the grid.
+        Conflicting cells are emptied first, then a naked or a hidden single is filled in. When the single does not agree
+        with the solution, some number filled in by user is wrong and it is corrected instead. When there is no single,
+        the empty cell with the fewest candidates is filled in from the solution.
+        :return: Hint object or None when the grid is completely and validly filled
+        """
+        if self.errorCells:
+            return Hint(next(iter(self.errorCells)), 0, 'conflict')
+
+        if self.candidates is None:
+            self.init_candidates()
+        else:
+            peers = self.tables.peers
+            for i, j in self.changedCells:
+                cell = self.size*i + j
+                self.update_candidates(cell)
+                for peer in peers[cell]:
+                    self.update_candidates(peer)
+            self.changedCells.clear()
+
+        cell = None
+        if self.nakedSingles:
+            cell = min(self.nakedSingles)
+            value = self.candidates[cell].bit_length()
+            reason = 'naked single'
+        elif self.hiddenSingles:
+            unit, indexN = divmod(min(self.hiddenSingles), self.size)
+            bit = 1 << indexN
+            cell = next(cell for cell in self.tables.units[unit] if self.candidates[cell] & bit)
+            value = indexN + 1
+            reason = 'hidden single'
+        if cell is not None:
+            i, j = divmod(cell, self.size)
+            solution = self.find_solution()
+            if solution is not None and solution[i][j] != value:
+                return self.find_mistake() or Hint((i, j), value, reason)
+            return Hint((i, j), value, reason)
+
+        emptyCells = [cell for cell in range(self.tables.cellCount) if not self.grid[cell // self.size][cell % self.size]]
+        if not emptyCells:
+            return None
+        solution = self.find_solution()
+        if solution is None:
+            raise ValueError("Puzzle has no solution")
+        # Without a single, a wrong number of user may make a cell without candidates
+        mistake = self.find_mistake()
+        if mistake is not None:
+            return mistake
+        i, j = divmod(min(emptyCells, key = lambda cell: self.candidates[cell].bit_count()), self.size)
+        return Hint((i, j), solution[i][j], 'solution')
+
+class SolveResult:
+    """Result of solving Sudoku grid to completion"""
+    status : int
+    grid : list
+    steps : int
+    backtracks : int
+    guesses : int
+
+    def __init__(self, status, grid, steps, backtracks, guesses = None):
+        """Initializes a SolveResult object
+
+        :param status: 0 if solved, 1 when solving was stopped by a limit, 2 when solution does not exist
+        :type status: int
+        :param grid: Sudoku grid, it is copied
+        :type grid: list of lists of int
+        :param steps: Number of performed solving steps
+        :type steps: int
+        :param backtracks: Number of values taken back during solving
+        :type backtracks: int
+        :param guesses: Number of guessed values, None if the solver does not count them
+        :type guesses: int
+        """
+        self.status = status
+        self.grid = [row[:] for row in grid]
+        self.steps = steps
+        self.backtracks = backtracks
+        self.guesses = guesses
+
+class Hint:
+    """Next move of the player returned by Sudoku.hint()
+
+    Reasons are 'conflict' (number of the cell repeats, value is 0 for emptying it), 'mistake' (number filled in by user
+    or by a stopped solving differs from the solution), 'naked single' (the only candidate of the cell), 'hidden single' (the only possible cell
+    of the number in a row, column or box) and 'solution' (no single can be found, the number is taken from the solution).
+    """
+    cell : tuple
+    value : int
+    reason : str
+
+    def __init__(self, cell, value, reason):
+        """Initializes a Hint object
+
+        :param cell: Coordinations (i, j) of the cell
+        :type cell: (int, int)
+        :param value: Number to fill in the cell, 0 for emptying it
+        :type value: int
+        :param reason: Why the number belongs to the cell
+        :type reason: str
+        """
+        self.cell = cell
+        self.value = value
+        self.reason = reason
+
+class SudokuSnapshot:
+    """Immutable state of a Sudoku grid returned by Sudoku.snapshot()
+
+    Everything is packed into bytes: values, starting indexes and counts take a byte each, cells are stored as flat indexes
+    and bitmasks as unsigned numbers, which take one and two bytes up to 16x16 grids and two and four bytes in 25x25 grids.
+    Prefilled cells and solution are shared with the Sudoku object.
+    """
+    __slots__ = ('size', 'grid', 'prefilled', 'masks', 'counts', 'errorCells', 'cellsChangedByUser', 'cellsToSolve', 'startingIndexes',
+                 'solvedCells', 'userCellsDropped', 'numberOfCellsToLeaveEmpty', 'solution')
+
+    def __init__(self, sudoku):
+        """Initializes a SudokuSnapshot object
+
+        :param sudoku: Sudoku object whose state is saved
+        :type sudoku: Sudoku
+        """
+        size = sudoku.size
+        self.size = size
+        self.grid = bytes(value for row in sudoku.grid for value in row)
+        self.prefilled = sudoku.prefilled # it is replaced, not changed, by map_grid()
+        cellType, maskType = SudokuSnapshot.array_types(size)
+        self.masks = array(maskType, sudoku.columns + sudoku.rows + sudoku.boxes).tobytes()
+        self.counts = bytes(sudoku.columnsCount) + bytes(sudoku.rowsCount) + bytes(sudoku.boxesCount)
+        self.errorCells = tuple(sudoku.errorCells.items()) # usually empty, its keys and flags are immutable tuples
+        self.cellsChangedByUser = array(cellType, [size*i + j for i, j in sudoku.cellsChangedByUser]).tobytes()
+        self.cellsToSolve = array(cellType, [size*i + j for i, j, _ in sudoku.cellsToSolve]).tobytes()
+        self.startingIndexes = bytes(startingIndex for _, _, startingIndex in sudoku.cellsToSolve)
+        self.solvedCells = array(cellType, [size*i + j for i, j in sudoku.solvedCells]).tobytes()
+        self.userCellsDropped = sudoku.userCellsDropped
+        self.numberOfCellsToLeaveEmpty = sudoku.numberOfCellsToLeaveEmpty
+        self.solution = sudoku.solution
+
+    @staticmethod
+    def array_types(size):
+        """Returns tuple (type code of flat cell indexes, type code of bitmasks) of arrays packing a grid of the given size"""
+        return ('B', 'H') if size <= 16 else ('H', 'I')
+
+    @staticmethod
+    def unpack(typeCode, data):
+        """Returns array of the given type code with numbers packed into data"""
+        numbers = array(typeCode)
+        numbers.frombytes(data)
+        return numbers
+
+class SolveStats:
+    """Counters of solving collected when instrumentation is enabled, see Sudoku.enable_stats()
+
+    Phases of a step are 'clear_errors' (emptying an invalid cell), 'forward' (filling a cell)
+    and 'backtrack' (emptying a filled cell), wall time of each phase is summed in phaseTimes.
+    """
+    phases = ('clear_errors', 'forward', 'backtrack')
+
+    def __init__(self, callback = None):
+        """Initializes a SolveStats object with zero counters
+
+        :param callback: Function called after every step as callback(phase, cell, stats), None for no callback
+        """
+        self.callback = callback
+        self.steps = 0
+        self.placements = 0 # numbers placed by solver
+        self.backtracks = 0 # numbers taken back by solver
+        self.maxDepth = 0 # maximal number of solved cells
+        self.probes = 0 # searches for a possible number of a cell
+        self.phaseTimes = dict.fromkeys(SolveStats.phases, 0.0) # in seconds
+
+    def record(self, phase, start, cell, depth = 0):
+        """Counts a finished step and calls the callback
+
+        :param phase: Phase of the step, one of phases
+        :type phase: str
+        :param start: perf_counter() value when the step started
+        :type start: float
+        :param cell: Coordinations (i, j) of the changed cell
+        :type cell: (int, int)
+        :param depth: Number of solved cells after the step
+        :type depth: int
+        """
+        self.phaseTimes[phase] += perf_counter() - start
+        self.steps += 1
+        if depth > self.maxDepth:
+            self.maxDepth = depth
+        if self.callback is not None:
+            self.callback(phase, cell, self)
+
+    def add_time(self, phase, start):
+        """Adds time from start to now to the phase"""
+        self.phaseTimes[phase] += perf_counter() - start
+
+    def add(self, other):
+        """Adds counters of other SolveStats object, e.g. to sum counters of many puzzles"""
+        self.steps += other.steps
+        self.placements += other.placements
+        self.backtracks += other.backtracks
+        self.maxDepth = max(self.maxDepth, other.maxDepth)
+        self.probes += other.probes
+        for phase in SolveStats.phases:
+            self.phaseTimes[phase] += other.phaseTimes[phase]
+
+    def to_dict(self):
+        """Returns counters as a dict, which can be written as JSON"""
+        return {
+            'steps': self.steps,
+            'placements': self.placements,
+            'backtracks': self.backtracks,
+            'max_depth': self.maxDepth,
+            'probes': self.probes,
+            'phase_s': dict(self.phaseTimes),
+        }
+
+def parse_puzzle(puzzle, size = None):
+    """Converts a puzzle string to a flat list of values
+
+    :param puzzle: String of cells row by row, '.' or '0' for empty cell, numbers above 9 are letters 'A'-'P', whitespace is ignored
+    :type puzzle: str
+    :param size: Largest allowed number, e.g. 9 for 9x9 grid, None for allowing all numbers up to 25
+    :type size: int
+    :return: list of values, 0 for empty cell
+    """
+    values = []
+    for character in puzzle:
+        value = symbols.find(character.upper())
+        if value >= 0:
+            if size is not None and value > size:
+                raise ValueError("Number '" + character + "' is too large for " + str(size) + "x" + str(size) + " grid")
+            values.append(value)
+        elif character == '.':
+            values.append(0)
+        elif not character.isspace():
+            raise ValueError("Invalid character '" + character + "' in puzzle")
+    return values
+
+def format_puzzle(grid):
+    """Converts Sudoku grid to a string of characters row by row, '0' for empty cell, numbers above 9 are letters 'A'-'P'
+
+    :param grid: Sudoku grid
+    :type grid: list of lists of int
+    """
+    return ''.join([symbols[value] for row in grid for value in row])
+
+def read_puzzles(lines):
+    """Yields puzzle strings from lines with one puzzle per line, e.g. from an opened file
+
+    Empty lines and lines starting with '#' are skipped. Lines are read lazily, so a file of any size can be processed.
+    :param lines: iterable of strings
+    :return: generator of puzzle strings
+    """
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+def solve_many(puzzles, solver = 'propagation', boxSize = 3):
+    """Solves puzzles one by one lazily
+
+    One Sudoku object is reused for all puzzles, so memory usage does not depend on the number of puzzles.
+    :param puzzles: iterable of puzzles, Sudoku grids or strings, see Sudoku.load_puzzle()
+    :param solver: Name of solver, 'backtracking' or one of solvers.solverBackends
+    :type solver: str
+    :param boxSize: Box size of the puzzles, see Sudoku
+    :type boxSize: int
+    :return: generator of SolveResult objects in the order of puzzles
+    """
+    sudoku = None
+    for puzzle in puzzles:
+        if sudoku is None:
+            sudoku = Sudoku(0, solver, puzzle = puzzle, boxSize = boxSize)
+        else:
+            sudoku.load_puzzle(puzzle)
+        yield sudoku.solve_full()
+
+def solve_chunk(puzzles, solver, boxSize = 3):
+    """Solves a chunk of puzzles in a worker process
+
+    :param puzzles: list of puzzle strings
+    :type puzzles: list of str
+    :param solver: Name of solver
+    :type solver: str
+    :return: list of solution strings, 'unsolvable' for puzzles without solution and 'invalid' for malformed puzzles
+    """
+    size = boxSize * boxSize
+    # Created from an empty grid, so an unknown solver or box size still raises instead of marking every puzzle invalid
+    sudoku = Sudoku(0, solver, puzzle = [[0] * size for _ in range(size)], boxSize = boxSize)
+    solutions = []
+    for puzzle in puzzles:
+        # A malformed line must not abort the whole run, output lines stay aligned with input lines
+        try:
+            sudoku.load_puzzle(puzzle)
+        except ValueError:
+            solutions.append('invalid')
+            continue
+        result = sudoku.solve_full()
+        solutions.append(format_puzzle(result.grid) if result.status == 0 else 'unsolvable')
+    return solutions
+
+def generate_chunk(chunk, numberOfCellsToLeaveEmpty, solver, unique, boxSize = 3, derive = 1, difficulty = None):
+    """Generates a chunk of puzzles in a worker process
+
+    :param chunk: tuple (index of the first puzzle, number of puzzles to generate, base seed or None for the module level random generator)
+    :type chunk: (int, int, int or str)
+    :param derive: Number of puzzles given by every generated puzzle, the generated one and derived ones, see derive.derive_puzzles()
+    :type derive: int
+    :param difficulty: Difficulty band of the puzzles, see generate_rated(), None for any difficulty
+    :type difficulty: str
+    :return: list of tuples (puzzle string, solution string, seed of the puzzle or None for derived puzzles)
+    """
+    firstIndex, count, seed = chunk
+    results = []
+    for index in range(firstIndex, firstIndex + count):
+        puzzleSeed = None if seed is None else derive_seed(seed, index)
+        if difficulty is None:
+            sudoku = Sudoku(numberOfCellsToLeaveEmpty, solver, unique, seed = puzzleSeed, boxSize = boxSize)
+        else:
+            sudoku, _, puzzleSeed = generate_rated(difficulty, solver, puzzleSeed, boxSize, numberOfCellsToLeaveEmpty)
+        puzzle, solution = format_puzzle(sudoku.grid), format_puzzle(sudoku.solution)
+        results.append((puzzle, solution, puzzleSeed))
+        if derive > 1:
+            rng = None if puzzleSeed is None else Random(puzzleSeed)
+            for derivedPuzzle, derivedSolution in derive_puzzles(puzzle, solution, derive - 1, rng, boxSize):
+                results.append((derivedPuzzle, derivedSolution, None))
+    return results
+
+def generate_rated(difficulty, solver = 'propagation', seed = None, boxSize = 3, numberOfCellsToLeaveEmpty = None, maxAttempts = 1000):
+    """Generates puzzles with a unique solution until one of them is rated in the given difficulty band
+
+    The returned seed generates the puzzle again by Sudoku(number of its empty cells, solver, True, seed = puzzleSeed).
+    :param difficulty: Name of a difficulty band, one of rating.difficulties
+    :type difficulty: str
+    :param seed: Seed from which seeds of the attempts are derived, None for the module level random generator
+    :type seed: int or str
+    :param numberOfCellsToLeaveEmpty: Maximal number of empty cells, None for leaving out as many cells as possible
+    :type numberOfCellsToLeaveEmpty: int
+    :param maxAttempts: Number of generated puzzles after which generating fails
+    :type maxAttempts: int
+    :return: tuple (Sudoku object, rating.Rating object, seed of the puzzle or None)
+    """
+    if difficulty not in difficulties:
+        raise ValueError("Unknown difficulty '" + difficulty + "'")
+    rater = DifficultyRater(boxSize)
+    if numberOfCellsToLeaveEmpty is None:
+        numberOfCellsToLeaveEmpty = rater.tables.cellCount
+    for attempt in range(maxAttempts):
+        puzzleSeed = None if seed is None else derive_seed(seed, attempt)
+        sudoku = Sudoku(numberOfCellsToLeaveEmpty, solver, True, seed = puzzleSeed, boxSize = boxSize)
+        rating = rater.rate(sudoku.grid)
+        if rating.difficulty == difficulty:
+            return (sudoku, rating, puzzleSeed)
+    raise ValueError("No " + difficulty + " puzzle found in " + str(maxAttempts) + " attempts")
+
+def derive_seed(seed, streamIndex):
+    """Derives seed of an independent random stream, e.g. for a worker or a single puzzle
+
+    The derived seed does not depend on the process or on hash randomization, so streams are reproducible.
+    It fits into 63 bits, so it can be stored in a puzzle store.
+    :param seed: Base seed
+    :type seed: int or str
+    :param streamIndex: Index of the stream
+    :type streamIndex: int
+    :return: seed for random.Random
+    :type return: int
+    """
+    return int.from_bytes(sha256((str(seed) + '/' + str(streamIndex)).encode()).digest()[:8], 'little') >> 1
+
+def seed_worker():
+    """Seeds random generators of a worker process, so forked workers do not generate the same puzzles"""
+    defaultRandom.seed()
+    random.seed()
+
+def map_chunks(executor, function, chunks, *arguments, window = 16):
+    """Runs function on chunks in executor and yields its results in the order of chunks
+
+    At most window chunks are submitted at once, so chunks are consumed lazily.
+    :param executor: Executor to run function in
+    :type executor: concurrent.futures.Executor
+    :param function: Function called as function(chunk, *arguments)
+    :param chunks: iterable of chunks
+    :param window: Maximal number of submitted chunks
+    :type window: int
+    :return: generator of items of results of all chunks
+    """
+    pending = deque()
+    for chunk in chunks:
+        pending.append(executor.submit(function, chunk, *arguments))
+        if len(pending) >= window:
+            yield from pending.popleft().result()
+    while pending:
+        yield from pending.popleft().result()
+
+def split_into_chunks(items, chunkSize):
+    """Yields lists of at most chunkSize items of the given iterable"""
+    iterator = iter(items)
+    chunk = list(islice(iterator, chunkSize))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, chunkSize))
+
+def solve_puzzles(puzzles, outputFile, solver = 'propagation', workers = None, chunkSize = 64, boxSize = 3):
+    """Solves puzzles in parallel worker processes
+
+    :param puzzles: iterable of puzzle strings, it is consumed lazily
+    :param outputFile: Opened file to which a solution is written for every puzzle in the same order
+    :param workers: Number of worker processes, None for number of CPUs
+    :type workers: int
+    :param chunkSize: Number of puzzles sent to a worker at once
+    :type chunkSize: int
+    :param boxSize: Box size of the puzzles, see Sudoku
+    :type boxSize: int
+    :return: number of solved puzzles
+    """
+    workers = workers or cpu_count()
+    count = 0
+    with ProcessPoolExecutor(workers) as executor:
+        for solution in map_chunks(executor, solve_chunk, split_into_chunks(puzzles, chunkSize), solver, boxSize, window = 4 * workers):
+            outputFile.write(solution + '\n')
+            count += 1
+    return count
+
+def solve_file(inputFile, outputFile, solver = 'propagation', workers = None, chunkSize = 64, boxSize = 3):
+    """Solves all puzzles of a file in parallel worker processes
+
+    :param inputFile: Opened file with one puzzle per line, see read_puzzles()
+    :return: number of solved puzzles, see solve_puzzles() for other parameters
+    """
+    return solve_puzzles(read_puzzles(inputFile), outputFile, solver, workers, chunkSize, boxSize)
+
+def generate_puzzles(count, numberOfCellsToLeaveEmpty, solver = 'backtracking', unique = False, workers = None, chunkSize = 64, seed = None, boxSize = 3, derive = 1, difficulty = None):
+    """Generates puzzles in parallel worker processes
+
+    When seed is given, every puzzle has its own seed derived from it, so the output is the same for any number of workers
+    and a single puzzle can be generated again by Sudoku(numberOfCellsToLeaveEmpty, solver, unique, seed = puzzleSeed).
+
+    :param count: Number of puzzles to generate
+    :type count: int
+    :param numberOfCellsToLeaveEmpty: Determins how many cells should be left out empty in each puzzle
+    :type numberOfCellsToLeaveEmpty: int
+    :param workers: Number of worker processes, None for number of CPUs
+    :type workers: int
+    :param chunkSize: Number of puzzles generated by a worker at once
+    :type chunkSize: int
+    :param seed: Seed of generating, None for random puzzles
+    :type seed: int or str
+    :param boxSize: Box size of the puzzles, see Sudoku
+    :type boxSize: int
+    :param derive: Number of puzzles given by every generated puzzle, see generate_chunk(), at most count * derive puzzles are given in total,
+        highly symmetric puzzles may give less derived puzzles
+    :type derive: int
+    :param difficulty: Difficulty band of the puzzles, see generate_rated(), numberOfCellsToLeaveEmpty is then the maximal
+        number of empty cells or None for as many as possible and puzzles always have a unique solution
+    :type difficulty: str
+    :return: generator of tuples (puzzle string, solution string, seed of the puzzle or None)
+    """
+    workers = workers or cpu_count()
+    chunks = [(first, min(chunkSize, count - first), seed) for first in range(0, count, chunkSize)]
+    with ProcessPoolExecutor(workers, initializer = seed_worker) as executor:
+        yield from map_chunks(executor, generate_chunk, chunks, numberOfCellsToLeaveEmpty, solver, unique, boxSize, derive, difficulty,
+                              window = 4 * workers)
+
+def generate_file(outputFile, count, numberOfCellsToLeaveEmpty, solver = 'backtracking', unique = False, workers = None, chunkSize = 64, seed = None, boxSize = 3, derive = 1, difficulty = None):
+    """Generates puzzles in parallel worker processes and writes them to a file, one puzzle per line
+
+    :param outputFile: Opened file to which puzzles are written
+    :return: number of generated puzzles, see generate_puzzles() for other parameters
+    """
+    written = 0 # deriving may give less puzzles than requested, see derive.maxDuplicates
+    for puzzle, _, _ in generate_puzzles(count, numberOfCellsToLeaveEmpty, solver, unique, workers, chunkSize, seed, boxSize, derive, difficulty):
+        outputFile.write(puzzle + '\n')
+        written += 1
+    return written
+
+def generate_store(path, count, numberOfCellsToLeaveEmpty, solver = 'backtracking', unique = False, workers = None, chunkSize = 64, seed = None, derive = 1, difficulty = None):
+    """Generates puzzles in parallel worker processes and writes them with their solutions and seeds to a puzzle store
+
+    :param path: Path of the store file, see store.PuzzleStoreWriter
+    :type path: str
+    :return: number of generated puzzles, see generate_puzzles() for other parameters
+    """
+    with PuzzleStoreWriter(path) as store:
+        for puzzle, solution, puzzleSeed in generate_puzzles(count, numberOfCellsToLeaveEmpty, solver, unique, workers, chunkSize, seed, derive = derive, difficulty = difficulty):
+            store.add(puzzle, solution, puzzleSeed)
+    return store.count
+
+def print_speed(count, seconds):
+    """Prints number of processed puzzles and their rate to standard error"""
+    print("%d puzzles in %.2f s, %.1f puzzles/s" % (count, seconds, count / seconds if seconds else 0), file = sys.stderr)
+
+def main(arguments = None):
+    """Prints generated Sudoku grid, or solves or generates puzzles in parallel when a command is given
+
+    :param arguments: Command line arguments, None for sys.argv
+    :type arguments: list of str
+    """
+    parser = ArgumentParser(description = "Generates and solves Sudoku puzzles")
+    commands = parser.add_subparsers(dest = 'command')
+
+    solveParser = commands.add_parser('solve', help = "solves puzzles from a file with one puzzle per line")
+    solveParser.add_argument('input', help = "file with puzzles, '-' for standard input")
+    solveParser.add_argument('--solver', default = 'propagation', choices = ['backtracking'] + list(solverBackends))
+    solveParser.add_argument('--store', action = 'store_true', help = "input is a puzzle store created by 'generate --store'")
+    solveParser.add_argument('--sample', type = int, default = None, help = "solve only this number of random puzzles of the store")
+    solveParser.add_argument('--empty', type = int, default = None, help = "sample only puzzles with this number of empty cells")
+    solveParser.add_argument('--seed', default = None, help = "seed of sampling")
+
+    generateParser = commands.add_parser('generate', help = "generates puzzles, one per line")
+    generateParser.add_argument('count', type = int, help = "number of puzzles")
+    generateParser.add_argument('--empty', type = int, default = None,
+                                help = "number of empty cells in each puzzle, 45 by default, maximal number of them with --difficulty")
+    generateParser.add_argument('--unique', action = 'store_true', help = "generate only puzzles with a unique solution")
+    generateParser.add_argument('--solver', default = 'backtracking', choices = ['backtracking'] + list(solverBackends))
+    generateParser.add_argument('--seed', default = None, help = "seed of generating, the same seed generates the same puzzles")
+    generateParser.add_argument('--difficulty', default = None, choices = difficulties,
+                                help = "generate only puzzles of this difficulty band rated by solving techniques, they have a unique solution")
+    generateParser.add_argument('--derive', type = int, default = 1, help = "number of puzzles given by every generated puzzle, the others are derived from it by symmetries")
+    generateParser.add_argument('--store', default = None, help = "write puzzles with solutions and seeds to this puzzle store instead of output")
+
+    for commandParser in (solveParser, generateParser):
+        commandParser.add_argument('--box-size', type = int, default = 3, choices = [2, 3, 4, 5], help = "box size, 3 for 9x9 and 4 for 16x16 puzzles")
+        commandParser.add_argument('--output', default = '-', help = "output file, '-' for standard output")
+        commandParser.add_argument('--workers', type = int, default = None, help = "number of worker processes")
+        commandParser.add_argument('--chunk-size', type = int, default = 64, help = "number of puzzles sent to a worker at once")
+
+    arguments = parser.parse_args(arguments)
+    if arguments.command is not None and arguments.store and arguments.box_size != 3:
+        parser.error("puzzle store holds only 9x9 puzzles")
+
+    if arguments.command is None:
+        sudoku = Sudoku(20)
+        for row in sudoku.grid:
+            print(*row)
+        print()
+        return
+
+    if arguments.command == 'generate' and arguments.empty is None and arguments.difficulty is None:
+        arguments.empty = 45
+
+    start = perf_counter()
+    if arguments.command == 'generate' and arguments.store:
+        count = generate_store(arguments.store, arguments.count, arguments.empty, arguments.solver, arguments.unique,
+                               arguments.workers, arguments.chunk_size, arguments.seed, arguments.derive, arguments.difficulty)
+        print_speed(count, perf_counter() - start)
+        return
+
+    outputFile = sys.stdout if arguments.output == '-' else open(arguments.output, 'w')
+    try:
+        if arguments.command == 'solve' and arguments.store:
+            with PuzzleStore(arguments.input) as store:
+                if arguments.sample is None:
+                    puzzles = store.puzzles()
+                else:
+                    puzzles = store.sample(arguments.sample, Random(arguments.seed), arguments.empty)
+                count = solve_puzzles(puzzles, outputFile, arguments.solver, arguments.workers, arguments.chunk_size)
+        elif arguments.command == 'solve':
+            inputFile = sys.stdin if arguments.input == '-' else open(arguments.input)
+            try:
+                count = solve_file(inputFile, outputFile, arguments.solver, arguments.workers, arguments.chunk_size, arguments.box_size)
+            finally:
+                if inputFile is not sys.stdin:
+                    inputFile.close()
+        else:
+            count = generate_file(outputFile, arguments.count, arguments.empty, arguments.solver, arguments.unique,
+                                  arguments.workers, arguments.chunk_size, arguments.seed, arguments.box_size, arguments.derive,
+                                  arguments.difficulty)
+    finally:
+        if outputFile is not sys.stdout:
+            outputFile.close()
+
+    print_speed(count, perf_counter() - start)
    
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,92 @@
+# Precomputed lookup tables of Sudoku grids and other names shared by Sudoku class and solvers
+# Cells are indexed either by coordinations (i, j) or as flat index size*i + j
+# Module level names are the tables of the standard 9x9 grid, get_tables() returns tables of a grid of any box size
+
+symbols = '0123456789ABCDEFGHIJKLMNOP' # Characters of numbers 0-25 in puzzle strings, 0 stands for empty cell
+
+class GridTables:
+    """Lookup tables of a grid with boxes of boxSize x boxSize cells, the grid has boxSize^2 rows, columns and boxes"""
+    def __init__(self, boxSize):
+        """Computes the tables
+
+        :param boxSize: Number of rows and columns of a box, 3 for the standard 9x9 grid
+        :type boxSize: int
+        """
+        size = boxSize * boxSize
+        self.boxSize = boxSize
+        self.size = size
+        self.cellCount = size * size
+        self.fullMask = (1 << size) - 1 # Bitmask with bits of all numbers set, bit x stands for number x + 1
+
+        # Box of each cell by coordinations, e.g. boxOfCell[4][7] == 5 in 9x9 grid
+        self.boxOfCell = [[boxSize*(i // boxSize) + (j // boxSize) for j in range(size)] for i in range(size)]
+
+        # Row, column and box of each cell by flat index
+        self.cellRow = [cell // size for cell in range(self.cellCount)]
+        self.cellColumn = [cell % size for cell in range(self.cellCount)]
+        self.cellBox = [self.boxOfCell[cell // size][cell % size] for cell in range(self.cellCount)]
+
+        # Flat indexes of cells of each row, column and box
+        self.rowCells = [[size*i + j for j in range(size)] for i in range(size)]
+        self.columnCells = [[size*i + j for i in range(size)] for j in range(size)]
+        self.boxCells = [[size*(boxSize*(b // boxSize) + k // boxSize) + boxSize*(b % boxSize) + k % boxSize for k in range(size)]
+                         for b in range(size)]
+
+        # All rows, columns and boxes
+        self.units = self.rowCells + self.columnCells + self.boxCells
+
+        # Flat indexes of the peers of each cell, i.e. other cells sharing a row, column or box with it
+        self.peers = [sorted(set(self.rowCells[self.cellRow[cell]] + self.columnCells[self.cellColumn[cell]]
+                                 + self.boxCells[self.cellBox[cell]]) - {cell}) for cell in range(self.cellCount)]
+
+        # Coordinations of the peers of each cell by coordinations, e.g. peerCoordinations[0][0] contains (0, 8) and (2, 2) in 9x9 grid
+        self.peerCoordinations = [[[divmod(peer, size) for peer in self.peers[size*i + j]] for j in range(size)] for i in range(size)]
+
+        # Used for resetting bitmasks of used numbers and counts of number uses in place
+        self.emptyMasks = [0] * size
+        self.emptyCounts = [0] * (size * size)
+
+class SolveLimitReached(Exception):
+    """Raised by solve() of solver backends when the given maximal number of steps or the deadline is reached"""
+    def __init__(self, steps, guesses):
+        """Initializes a SolveLimitReached object
+
+        :param steps: Number of steps done before solving was stopped
+        :type steps: int
+        :param guesses: Number of guesses done before solving was stopped
+        :type guesses: int
+        """
+        super().__init__("Solving was stopped after " + str(steps) + " steps")
+        self.steps = steps
+        self.guesses = guesses
+
+gridTables = {} # Tables of already used box sizes { boxSize : GridTables }
+
+def get_tables(boxSize):
+    """Returns tables of a grid with the given box size, they are computed only once for each box size
+
+    :param boxSize: Number of rows and columns of a box, 2 to 5
+    :type boxSize: int
+    :return: GridTables object
+    """
+    tables = gridTables.get(boxSize)
+    if tables is None:
+        if not 2 <= boxSize <= 5:
+            raise ValueError("Box size must be between 2 and 5")
+        tables = GridTables(boxSize)
+        gridTables[boxSize] = tables
+    return tables
+
+standardTables = get_tables(3)
+
+fullMask = standardTables.fullMask
+boxOfCell = standardTables.boxOfCell
+cellRow = standardTables.cellRow
+cellColumn = standardTables.cellColumn
+cellBox = standardTables.cellBox
+rowCells = standardTables.rowCells
+columnCells = standardTables.columnCells
+boxCells = standardTables.boxCells
+units = standardTables.units
+peers = standardTables.peers
+peerCoordinations = standardTables.peerCoordinations
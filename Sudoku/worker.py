@@ -0,0 +1,86 @@
+from collections import deque
+from threading import Condition, Thread
+
+class SolvingWorker:
+    """SolvingWorker solves a Sudoku puzzle in a background thread and publishes snapshots of its grid
+
+    In animated mode a snapshot of every solving step is kept until it is taken, so the steps can be replayed at any speed,
+    solving waits when bufferSize snapshots are not taken yet. Otherwise solving runs at full speed and only the latest
+    snapshot is kept. The Sudoku object must not be changed by other threads until the worker is finished or cancelled.
+    It does not depend on the GUI.
+    """
+    def __init__(self, sudoku, animated = True, bufferSize = 64, stepsPerSnapshot = 10000):
+        """Initializes a SolvingWorker object and starts solving in the background
+
+        :param sudoku: Sudoku object to solve
+        :type sudoku: Sudoku
+        :param animated: True for keeping a snapshot of every step, False for keeping only the latest one
+        :type animated: bool
+        :param bufferSize: Maximal number of snapshots not taken yet in animated mode
+        :type bufferSize: int
+        :param stepsPerSnapshot: Number of solving steps between snapshots when not animated
+        :type stepsPerSnapshot: int
+        """
+        self.sudoku = sudoku
+        self.animated = animated
+        self.bufferSize = bufferSize
+        self.stepsPerSnapshot = 1 if animated else stepsPerSnapshot
+
+        # Guards snapshots, steps, status and isCancelled, the background thread waits on it when the buffer is full
+        self.condition = Condition()
+        self.snapshots = deque() # grids not taken yet, oldest first
+        self.steps = 0 # number of finished solving steps
+        self.status = None # None while solving, then 0 if solved, 2 when solution does not exist
+        self.isCancelled = False
+        self.thread = Thread(target = self.run, name = "SolvingWorker", daemon = True)
+        self.thread.start()
+
+    def run(self):
+        """Solves the puzzle and publishes snapshots until it is solved or cancelled, runs in the background thread"""
+        status = 1
+        while status == 1:
+            # solve_full() continues where the previous call stopped and returns a copy of the grid,
+            # solver backends would start again on every call, so they solve the puzzle in one call
+            result = self.sudoku.solve_full(maxSteps = self.stepsPerSnapshot if self.sudoku.is_resumable() else None)
+            status = result.status
+            with self.condition:
+                while self.animated and not self.isCancelled and len(self.snapshots) >= self.bufferSize:
+                    self.condition.wait()
+                if self.isCancelled:
+                    return
+                if not self.animated:
+                    self.snapshots.clear()
+                self.snapshots.append(result.grid)
+                self.steps += result.steps
+                if status != 1:
+                    self.status = status
+
+    def take(self, count = 1):
+        """Takes up to count oldest snapshots
+
+        :param count: Number of solving steps to advance by in animated mode
+        :type count: int
+        :return: the newest of the taken grids or None when there is no new snapshot
+        """
+        grid = None
+        with self.condition:
+            while count > 0 and self.snapshots:
+                grid = self.snapshots.popleft()
+                count -= 1
+            self.condition.notify()
+        return grid
+
+    def finished(self):
+        """Returns status of solving when it is finished and all snapshots were taken, otherwise None
+
+        :return: None, 0 if solved, 2 when solution does not exist
+        """
+        with self.condition:
+            return None if self.snapshots else self.status
+
+    def cancel(self):
+        """Stops solving and waits for the background thread, the Sudoku object is left partially solved"""
+        with self.condition:
+            self.isCancelled = True
+            self.condition.notify()
+        self.thread.join()